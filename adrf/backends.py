@@ -0,0 +1,54 @@
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class AsyncLocMemCache(LocMemCache):
+    """
+    Local-memory cache whose async methods run directly on the event loop.
+
+    Django's `BaseCache` implements the async API by handing every call to
+    `sync_to_async`, so each `aget` or `ahas_key` costs a thread pool round
+    trip, and `aget_many` costs one per key. The local-memory operations only
+    hold a lock around a dict lookup and never block, so they are simply
+    called inline here. Eviction (LRU up to `MAX_ENTRIES`) and expiry are the
+    ones of `LocMemCache`.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "drf_async_mixins.adrf.backends.AsyncLocMemCache",
+        }
+    }
+    """
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.add(key, value, timeout, version)
+
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set(key, value, timeout, version)
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.touch(key, timeout, version)
+
+    async def adelete(self, key, version=None):
+        return self.delete(key, version)
+
+    async def aget_many(self, keys, version=None):
+        return self.get_many(keys, version)
+
+    async def ahas_key(self, key, version=None):
+        return self.has_key(key, version)
+
+    async def aincr(self, key, delta=1, version=None):
+        return self.incr(key, delta, version)
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.set_many(data, timeout, version)
+
+    async def adelete_many(self, keys, version=None):
+        self.delete_many(keys, version)
+
+    async def aclear(self):
+        self.clear()
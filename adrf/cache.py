@@ -0,0 +1,541 @@
+import asyncio
+import contextvars
+import logging
+import marshal
+import pickle
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from math import ceil, log
+from time import monotonic, time
+from typing import Any, NamedTuple, Optional
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first coroutine asking for a key runs the builder in its own task,
+    every coroutine arriving while that task is in flight awaits its result.
+
+    The task can outlive the request that started it, so it runs in an empty
+    context instead of a copy of the request's one, whose thread-sensitive
+    executor is never shut down once the request is over, and closes the
+    database connections of its thread when done.
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def run(self, key, func, *args, **kwargs):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        future = calls.get(key)
+        if future is None:
+            future = contextvars.Context().run(
+                asyncio.ensure_future, _aclosing_connections(func(*args, **kwargs))
+            )
+            calls[key] = future
+
+            def forget(_):
+                if calls.get(key) is future:
+                    del calls[key]
+
+            future.add_done_callback(forget)
+        # Shielded so that a disconnecting client doesn't cancel the rebuild
+        # for everyone else waiting on the same key.
+        return await asyncio.shield(future)
+
+
+async def _aclosing_connections(awaitable):
+    try:
+        return await awaitable
+    finally:
+        await sync_to_async(close_old_connections)()
+
+
+single_flight = SingleFlight()
+
+
+async def acquire_lock(cache, key, timeout):
+    token = uuid4().hex
+    if await cache.aadd(f"{key}:lock", token, timeout):
+        return token
+    return None
+
+
+async def release_lock(cache, key, token):
+    if await cache.aget(f"{key}:lock") == token:
+        await cache.adelete(f"{key}:lock")
+
+
+async def acoalesce(cache, key, build, wait, lock_timeout=None, lock_poll=0.05):
+    """
+    Runs `build()` once per key in this process. With `lock_timeout` set, a
+    lock in the cache backend extends this to other processes: whoever loses
+    the lock polls `wait()` until the winner has published the entry, and only
+    rebuilds it itself once the lock has expired.
+    """
+    return await single_flight.run(
+        key, _alocked_build, cache, key, build, wait, lock_timeout, lock_poll
+    )
+
+
+async def _alocked_build(cache, key, build, wait, lock_timeout, lock_poll):
+    if lock_timeout is None:
+        return await build()
+    token = await acquire_lock(cache, key, lock_timeout)
+    if token is None:
+        deadline = monotonic() + lock_timeout
+        while monotonic() < deadline:
+            await asyncio.sleep(lock_poll)
+            data = await wait()
+            if data is not None:
+                return data
+        return await build()
+    try:
+        return await build()
+    finally:
+        await release_lock(cache, key, token)
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    stale_at: Optional[float]
+
+
+def pack_entry(value, timeout, stale_ttl):
+    """
+    Wraps a value with its soft expiry when stale-while-revalidate is enabled.
+    The entry has to be stored with `stale_timeout()` as its hard expiry.
+    """
+    if not stale_ttl or timeout is None:
+        return value
+    return CacheEntry(value, time() + timeout)
+
+
+def stale_timeout(timeout, stale_ttl):
+    if not stale_ttl or timeout is None:
+        return timeout
+    return timeout + stale_ttl
+
+
+def unpack_entry(entry):
+    """
+    Returns the cached value and whether it is past its soft expiry.
+    """
+    if isinstance(entry, CacheEntry):
+        return entry.value, entry.stale_at is not None and entry.stale_at <= time()
+    return entry, False
+
+
+class CompactCodec:
+    """
+    Stores serialized representations as plain dict and list trees encoded
+    with `marshal`, behind `HEADER`.
+
+    `OrderedDict` and `ReturnDict` values are stored as plain dicts, which
+    keep their field order. Lists of dicts sharing the same fields, e.g. the
+    items of a nested `many=True` serializer, are stored column by column
+    behind a schema holding their field names once, and rebuilt by a
+    function generated once per schema. Other dicts share their field names
+    within an entry. Entries end up smaller than pickled ordered dicts and
+    load faster, see `python -m benchmarks.compact_codec`.
+
+    Values holding anything but dicts with string keys, lists, tuples,
+    strings, bytes, numbers, booleans and None are stored untouched, i.e.
+    pickled by the cache backend. A value that can't be decoded, e.g.
+    corrupt bytes, decodes to None, i.e. reads as a miss.
+    """
+    HEADER = b"adrf:marshal:4:"
+
+    def encode(self, value):
+        try:
+            tree, _ = _compact_tree(value, {})
+        except TypeError:
+            return value
+        return self.HEADER + marshal.dumps(tree, 4)
+
+    def decode(self, value):
+        if isinstance(value, bytes) and value.startswith(self.HEADER):
+            try:
+                return _expand_tree(marshal.loads(memoryview(value)[len(self.HEADER):]))
+            except (EOFError, IndexError, TypeError, ValueError):
+                return None
+        return value
+
+
+_SCALAR_TYPES = frozenset((str, int, float, bool, bytes, type(None)))
+
+# Kinds of the containers rebuilt by `_expand_tree`, stored as tuples starting
+# with an Ellipsis, which representations never hold.
+_ROWS, _LIST, _DICT = 0, 1, 2
+
+
+def _compact_tree(value, names):
+    """
+    Returns the tree to store for `value` and whether it holds columns that
+    `_expand_tree` has to rebuild rows from.
+    """
+    if type(value) in _SCALAR_TYPES:
+        return value, False
+    if isinstance(value, dict):
+        tree, expand = {}, False
+        for name, item in value.items():
+            if type(name) is not str:
+                raise TypeError(name)
+            tree[names.setdefault(name, name)], item_expand = _compact_tree(item, names)
+            expand = expand or item_expand
+        return ((..., _DICT, tree), True) if expand else (tree, False)
+    if isinstance(value, list):
+        fields = _get_row_fields(value)
+        if fields is not None:
+            fields = tuple(names.setdefault(name, name) for name in fields)
+            columns = [_compact_tree([row[name] for row in value], names)[0] for name in fields]
+            return (..., _ROWS, fields, columns), True
+        items = [_compact_tree(item, names) for item in value]
+        if any(expand for _, expand in items):
+            return (..., _LIST, [item for item, _ in items]), True
+        return [item for item, _ in items], False
+    if type(value) is tuple:
+        return tuple(_plain_tree(item, names) for item in value), False
+    raise TypeError(value)
+
+
+def _get_row_fields(rows):
+    if not rows or not isinstance(rows[0], dict) or not rows[0]:
+        return None
+    fields = tuple(rows[0])
+    if not all(isinstance(row, dict) and tuple(row) == fields for row in rows):
+        return None
+    for name in fields:
+        if type(name) is not str:
+            raise TypeError(name)
+    return fields
+
+
+def _plain_tree(value, names):
+    if type(value) in _SCALAR_TYPES:
+        return value
+    if isinstance(value, dict):
+        tree = {}
+        for name, item in value.items():
+            if type(name) is not str:
+                raise TypeError(name)
+            tree[names.setdefault(name, name)] = _plain_tree(item, names)
+        return tree
+    if isinstance(value, list):
+        return [_plain_tree(item, names) for item in value]
+    if type(value) is tuple:
+        return tuple(_plain_tree(item, names) for item in value)
+    raise TypeError(value)
+
+
+def _expand_tree(tree):
+    if type(tree) is not tuple or not tree or tree[0] is not ...:
+        return tree
+    kind = tree[1]
+    if kind == _ROWS:
+        return _get_rows_builder(tree[2])(list(map(_expand_tree, tree[3])))
+    if kind == _LIST:
+        return list(map(_expand_tree, tree[2]))
+    return {name: _expand_tree(item) for name, item in tree[2].items()}
+
+
+@lru_cache(maxsize=256)
+def _get_rows_builder(fields):
+    # A dict display builds the rows about twice as fast as dict(zip(...)).
+    names = [f"v{index}" for index in range(len(fields))]
+    items = ", ".join(f"{field!r}: {name}" for field, name in zip(fields, names))
+    source = f"lambda columns: [{{{items}}} for ({', '.join(names)},) in zip(*columns)]"
+    return eval(compile(source, "<compact rows>", "eval"))
+
+
+class ZlibCodec:
+    """
+    Compresses cached values whose encoded size reaches `threshold` bytes.
+
+    Values are first encoded with `codec`, a `CompactCodec` by default. A
+    compressed value is stored as bytes made of `HEADER` followed by the zlib
+    stream of its pickle, smaller values are stored as encoded by `codec`.
+    This keeps large pages under the item size limit of memcached and saves
+    memory on Redis, at the cost of the compression time on writes and the
+    decompression time on reads, see `python -m benchmarks.codec`.
+    """
+    HEADER = b"adrf:zlib:1:"
+
+    def __init__(self, threshold=16 * 1024, level=6, codec=None):
+        self.threshold = threshold
+        self.level = level
+        self.codec = CompactCodec() if codec is None else codec
+
+    def encode(self, value):
+        value = self.codec.encode(value)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) < self.threshold:
+            return value
+        return self.HEADER + zlib.compress(data, self.level)
+
+    def decode(self, value):
+        if isinstance(value, bytes) and value.startswith(self.HEADER):
+            try:
+                value = pickle.loads(zlib.decompress(value[len(self.HEADER):]))
+            except (pickle.UnpicklingError, zlib.error, EOFError, ValueError):
+                return None
+        return self.codec.decode(value)
+
+
+class ChunkManifest(NamedTuple):
+    token: str
+    count: int
+    pickled: bool
+
+
+def split_entry(key, entry, max_size):
+    """
+    Splits an encoded entry larger than `max_size` bytes into chunks.
+
+    Returns the entry to store under `key`, where the value is replaced by a
+    `ChunkManifest`, and the chunks to store next to it. Every write uses
+    fresh chunk keys, so that a reader never mixes the chunks of two writes;
+    chunks left behind by an overwrite or a delete expire with their entry.
+    """
+    value = entry.value if isinstance(entry, CacheEntry) else entry
+    pickled = not isinstance(value, bytes)
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL) if pickled else value
+    if len(data) <= max_size:
+        return entry, {}
+    manifest = ChunkManifest(uuid4().hex, -(-len(data) // max_size), pickled)
+    chunks = dict(zip(
+        chunk_keys(key, manifest),
+        (data[start:start + max_size] for start in range(0, len(data), max_size)),
+    ))
+    if isinstance(entry, CacheEntry):
+        return entry._replace(value=manifest), chunks
+    return manifest, chunks
+
+
+def get_manifest(entry):
+    value = entry.value if isinstance(entry, CacheEntry) else entry
+    return value if isinstance(value, ChunkManifest) else None
+
+
+def chunk_keys(key, manifest):
+    return [f"{key}:chunk:{manifest.token}:{index}" for index in range(manifest.count)]
+
+
+def join_entry(key, entry, chunks):
+    """
+    Reassembles a chunked entry from the fetched `chunks`, returns None when
+    one of them has been evicted.
+    """
+    manifest = get_manifest(entry)
+    try:
+        data = b"".join(chunks[chunk_key] for chunk_key in chunk_keys(key, manifest))
+    except KeyError:
+        return None
+    value = pickle.loads(data) if manifest.pickled else data
+    if isinstance(entry, CacheEntry):
+        return entry._replace(value=value)
+    return value
+
+
+_background_tasks = set()
+
+
+def revalidate(key, build):
+    """
+    Rebuilds a stale entry in a background task, unless a rebuild of the same
+    key is already in flight. Like the rebuild, see `SingleFlight`, the task
+    runs in an empty context rather than in the one of the request.
+    """
+    task = contextvars.Context().run(asyncio.ensure_future, single_flight.run(key, build))
+    _background_tasks.add(task)
+    task.add_done_callback(_revalidated)
+
+
+def _revalidated(task):
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    # The object is gone, the rebuild has cached the 404 if it should.
+    if exc is not None and not isinstance(exc, Http404):
+        logger.warning("Failed to revalidate a cache entry", exc_info=exc)
+
+
+class LocalCache:
+    """
+    A bounded in-process LRU cache used as a first tier in front of the
+    configured Django cache.
+
+    Entries expire after at most `timeout` seconds, which bounds how long a
+    write made by another process can go unnoticed. Least recently used
+    entries are evicted once `max_entries` or `max_bytes` is exceeded, the
+    size of an entry being approximated by its pickled length. Values are
+    kept by reference and must not be mutated by callers.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, timeout=5):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at, _ = item
+            if expires_at <= monotonic():
+                self._remove(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        missing = object()
+        found = {}
+        for key in keys:
+            value = self.get(key, missing)
+            if value is not missing:
+                found[key] = value
+        return found
+
+    def has_key(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if timeout <= 0 or size > self.max_bytes:
+                return
+            self._data[key] = (value, monotonic() + timeout, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def set_many(self, data, timeout=None):
+        for key, value in data.items():
+            self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        self._bytes -= self._data.pop(key)[2]
+
+
+class BloomFilter:
+    """
+    A set of keys answering membership with no false negatives and a false
+    positive rate of `error_rate` once it holds `capacity` keys.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing over the two halves of one digest.
+        digest = blake2b(str(key).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class PkIndex:
+    """
+    An in-process Bloom filter of the primary keys of a model, used to
+    answer retrieves of pks that can't exist without any cache or database
+    access.
+
+    The filter is built from `values_list("pk")` by `abuild()`, which can be
+    awaited at startup, or else in the background on first use, and rebuilt
+    every `rebuild_interval` seconds; a failed build is only retried after
+    that interval as well. Until then every pk is let through.
+    Created pks are added by the create mixins. Deleted pks stay in the
+    filter until the next rebuild, which only costs them a regular lookup.
+    Integer pks above the largest one seen when building are always let
+    through, so that rows created by other processes are found; with other
+    pk types, all writes have to go through this process.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01, rebuild_interval=3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._filter = None
+        self._max_pk = None
+        self._build_started_at = None
+        self._added = None
+
+    def might_exist(self, pk, queryset):
+        started_at = self._build_started_at
+        if started_at is None or monotonic() - started_at > self.rebuild_interval:
+            # Recorded before the build runs, so that it runs at most once per
+            # interval, even while it fails.
+            self._build_started_at = monotonic()
+            revalidate(f"pk-index:{id(self)}", lambda: self.abuild(queryset))
+        if self._filter is None:
+            return True
+        if isinstance(pk, int) and (self._max_pk is None or pk > self._max_pk):
+            return True
+        return pk in self._filter
+
+    def add(self, pk):
+        if self._filter is not None:
+            self._filter.add(pk)
+        if self._added is not None:
+            self._added.append(pk)
+
+    async def abuild(self, queryset):
+        self._build_started_at = monotonic()
+        # Pks created while the filter is built are replayed into it.
+        self._added = []
+        try:
+            bloom = BloomFilter(max(self.capacity, await queryset.acount()), self.error_rate)
+            max_pk = None
+            async for pk in queryset.values_list("pk", flat=True).order_by():
+                bloom.add(pk)
+                if isinstance(pk, int) and (max_pk is None or pk > max_pk):
+                    max_pk = pk
+            for pk in self._added:
+                bloom.add(pk)
+        finally:
+            self._added = None
+        self._filter, self._max_pk = bloom, max_pk
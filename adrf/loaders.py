@@ -0,0 +1,76 @@
+import asyncio
+
+
+class DataLoader:
+    """
+    Batches the keys requested through `load()` during one iteration of the
+    event loop into a single call of `batch_load(keys)`, which returns a
+    mapping of the found keys to their values. Missing keys load as None.
+
+    Loaded keys are remembered, a loader is meant to live as long as the
+    request it serves. `delay` extends the batching window to that many
+    seconds, for callers that reach `load()` a thread hop apart.
+    """
+
+    def __init__(self, batch_load, delay=None):
+        self.batch_load = batch_load
+        self.delay = delay
+        self._futures = {}
+        self._pending = []
+        # The loop only keeps weak references to its tasks.
+        self._tasks = set()
+
+    async def load(self, key):
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._pending:
+                if self.delay:
+                    loop.call_later(self.delay, self._dispatch)
+                else:
+                    loop.call_soon(self._dispatch)
+            self._pending.append(key)
+        # Shielded, the same future is awaited by every caller of the key.
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._aresolve(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _aresolve(self, keys):
+        try:
+            values = await self.batch_load(keys)
+        except BaseException as exc:
+            # Failures aren't remembered, the next load retries.
+            for key in keys:
+                future = self._futures.pop(key)
+                if isinstance(exc, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+        else:
+            for key in keys:
+                self._futures[key].set_result(values.get(key))
+
+
+def get_model_loader(owner, model, delay=None):
+    """
+    Returns the loader of `model` instances by pk attached to `owner`,
+    usually the request, creating it on first use.
+    """
+    loaders = owner.__dict__.setdefault("_data_loaders", {})
+    loader = loaders.get(model)
+    if loader is None:
+        async def batch_load(pks):
+            return {
+                instance.pk: instance
+                async for instance in model._default_manager.filter(pk__in=pks)
+            }
+
+        loader = loaders[model] = DataLoader(batch_load, delay)
+    return loader
@@ -1,258 +1,919 @@
-from hashlib import md5
-from asgiref.sync import sync_to_async
-from adrf import mixins
-from adrf.viewsets import GenericViewSet
-from django.core.cache import cache
-from rest_framework import status
-from rest_framework.response import Response
-
-
-async def generate_cache_key(view):
-    model_name = view.get_serializer_class()
-    return md5(model_name.Meta.model.__name__.lower().encode()).hexdigest()
-
-
-async def generate_request_cache_key(request):
-    return md5(request.get_full_path().encode()).hexdigest()
-
-
-async def get_data(serializer):
-    try:
-        data = await serializer.adata
-    except Exception:
-        data = await sync_to_async(getattr)(serializer, 'data')
-    return data
-
-
-class ListModelMixin(mixins.ListModelMixin):
-    async def alist(self, request, *args, **kwargs):
-        cache_key_page = await generate_request_cache_key(request)
-        cache_key = await generate_cache_key(self)
-        if not await cache.ahas_key(cache_key_page):
-            queryset = self.filter_queryset(self.get_queryset())
-            page = await self.apaginate_queryset(queryset)
-            serializer = self.get_serializer(queryset if page is None else page, many=True)
-            id_name = getattr(serializer.__class__, "custom_id", "id")
-            data = await get_data(serializer)
-            data_ids, cached_data = [], {}
-            for item in data:
-                cache_key_id = f"{cache_key}:{item[id_name]}"
-                if not await cache.ahas_key(cache_key_id):
-                    cached_data[cache_key_id] = item
-                data_ids.append(item[id_name])
-            cached_data[cache_key_page] = data_ids
-            await cache.aset_many(cached_data, 100, None)
-            return await self.get_apaginated_response(data) if page is not None else Response(
-                data, status=status.HTTP_200_OK
-            )
-        cached_ids = await cache.aget(cache_key_page)
-        data = await cache.aget_many((f"{cache_key}:{id}" for id in cached_ids))
-        data = tuple(data.values())
-        if hasattr(self, "pagination_class"):
-            return await self.get_apaginated_response(
-                await self.apaginate_queryset(data)
-            )
-        return Response(data, status=status.HTTP_200_OK)
-
-
-class RetrieveModelMixin(mixins.RetrieveModelMixin):
-    async def aretrieve(self, request, *args, **kwargs):
-        cache_key = f"{await generate_cache_key(self)}:{self.kwargs['pk']}"
-        if await cache.ahas_key(cache_key):
-            return Response(await cache.aget(cache_key), status=status.HTTP_200_OK)
-        instance = await self.aget_object()
-        data = await get_data(self.get_serializer(instance, many=False))
-        await cache.aset(cache_key, data)
-        return Response(data, status=status.HTTP_200_OK)
-
-
-class CreateModelMixin(mixins.CreateModelMixin):
-    async def acreate(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        await sync_to_async(serializer.is_valid)(raise_exception=True)
-        await self.perform_acreate(serializer)
-        data = await get_data(serializer)
-        headers = self.get_success_headers(data)
-        id_name = getattr(self.serializer_class, "custom_id", "id")
-        cache_key = f"{await generate_cache_key(self)}:{data[id_name]}"
-        await cache.aset(cache_key, data)
-        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
-
-
-class UpdateModelMixin(mixins.UpdateModelMixin):
-    async def aupdate(self, request, *args, **kwargs):
-        response = await mixins.UpdateModelMixin.aupdate(self, request, *args, **kwargs)
-        await cache.aset(
-            f"{await generate_cache_key(self)}:{self.kwargs['pk']}",
-            response.data
-        )
-        return response
-
-
-class DestroyModelMixin(mixins.DestroyModelMixin):
-    async def adestroy(self, request, *args, **kwargs):
-        response = await mixins.DestroyModelMixin.adestroy(self, request, *args, **kwargs)
-        cache_key = f"{await generate_cache_key(self)}:{self.kwargs['pk']}"
-        if await cache.ahas_key(cache_key):
-            await cache.adelete(cache_key)
-        return response
-
-
-class ReadOnlyModelViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
-    """
-    A viewset that provides default asynchronous `list()` and `retrieve()` actions.
-    """
-    pass
-
-
-class CachedModelViewSet(
-    CreateModelMixin,
-    ListModelMixin,
-    RetrieveModelMixin,
-    UpdateModelMixin,
-    DestroyModelMixin,
-    GenericViewSet,
-):
-    """
-    A viewset that provides default asynchronous `create()`, `retrieve()`, `update()`,
-    `partial_update()`, `destroy()` and `list()` actions.
-    """
-    pass
-
-
-class CacheMixinBase:
-    async def _generate_cache_key(self):
-        return md5(self.__class__.__name__.lower().encode()).hexdigest()
-
-    async def _generate_request_cache_key(self, request):
-        cache_key = md5(request.get_full_path().encode()).hexdigest()
-        if isinstance(self, Owned):
-            cache_key = f'{cache_key}:{md5(str(request.user.id).encode()).hexdigest()}'
-        return cache_key
-
-
-class ListMixin(CacheMixinBase):
-    async def get(self, request, *args, **kwargs):
-        cache_key_page = await self._generate_request_cache_key(request)
-        cache_key = await self._generate_cache_key()
-        paginator_cls = getattr(self, "pagination_class", None)
-        if paginator_cls:
-            paginator = paginator_cls()
-            paginator.request = request
-            if "LimitOffset" in paginator_cls.__name__:
-                paginator.offset = paginator.get_offset(request)
-                paginator.limit = paginator.get_limit(request)
-
-        if not await cache.ahas_key(cache_key_page):
-            queryset = self.filter_queryset(self.get_queryset())
-            data = await sync_to_async(getattr)(self.get_serializer(
-                queryset if not paginator else await paginator.paginate_queryset(
-                    queryset, request, view=self
-                ), many=True
-            ), 'data')
-            id_name = getattr(self.serializer_class, "custom_id", "id")
-            items = data.get("results", data) if isinstance(data, dict) else data
-            data_ids, cached_data = [], {}
-            for item in items:
-                cache_key_id = f"{cache_key}:{item[id_name]}"
-                if not await cache.ahas_key(cache_key_id):
-                    cached_data[cache_key_id] = item
-                data_ids.append(item[id_name])
-            cached_data[cache_key_page] = data_ids
-            await cache.aset_many(cached_data, 100, None)
-            return await sync_to_async(paginator.get_paginated_response)(data)
-
-        cached_ids = await cache.aget(cache_key_page)
-        data = await cache.aget_many((f"{cache_key}:{id}" for id in cached_ids))
-        data = tuple(data.values())
-        if paginator_cls:
-            if "LimitOffset" in paginator_cls.__name__:
-                paginator.count = await self.get_queryset().acount()
-            else:
-                paginator.page = data
-            return await sync_to_async(paginator.get_paginated_response)(data)
-        return Response(data)
-
-
-class CreateMixin(CacheMixinBase):
-    async def post(self, request, *args, **kwargs):
-        resp = await self.acreate(request, *args, **kwargs)
-        id_name = getattr(self.serializer_class, "custom_id", "id")
-        cache_key = f"{await self._generate_cache_key()}:{resp.data[id_name]}"
-        await cache.aset(cache_key, resp.data)
-        return resp
-
-
-class RetrieveMixin(CacheMixinBase):
-    async def retrieve(self, request, *args, **kwargs):
-        cache_key = f"{await self._generate_cache_key()}:{self.kwargs['pk']}"
-        if await cache.ahas_key(cache_key):
-            return Response(await cache.aget(cache_key))
-        else:
-            serializer = self.get_serializer()
-            response = Response(await sync_to_async(
-                serializer.to_representation
-            )(await self.aget_object()))
-            await cache.aset(cache_key, response.data)
-            return response
-
-
-class UpdateMixin(CacheMixinBase):
-    async def aupdate(self, request, *args, **kwargs):
-        partial = kwargs.pop("partial", False)
-        instance = await self.aget_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
-        await sync_to_async(serializer.is_valid)(raise_exception=True)
-        await serializer.asave()
-        if getattr(instance, "_prefetched_objects_cache", None):
-            instance._prefetched_objects_cache = {}
-        return Response(
-            await sync_to_async(getattr)(serializer, 'data'),
-            status=status.HTTP_200_OK
-        )
-
-    async def patch(self, request, *args, **kwargs):
-        cache_key = f"{await self._generate_cache_key()}:{self.kwargs['pk']}"
-        kwargs["partial"] = True
-        resp = await self.aupdate(request, *args, **kwargs)
-        await cache.aset(cache_key, resp.data)
-        return resp
-
-    async def put(self, request, *args, **kwargs):
-        cache_key = f"{await self._generate_cache_key()}:{self.kwargs['pk']}"
-        resp = await self.aupdate(request, *args, **kwargs)
-        await cache.aset(cache_key, resp.data)
-        return resp
-
-
-class DestroyMixin(CacheMixinBase):
-    async def delete(self, request, *args, **kwargs):
-        cache_key = f"{await self._generate_cache_key()}:{self.kwargs['pk']}"
-        instance = await self.aget_object()
-        await instance.adelete()
-        resp = Response(status=status.HTTP_204_NO_CONTENT)
-        if await cache.ahas_key(cache_key):
-            await cache.adelete(cache_key)
-        return resp
-
-
-class ListCreateMixin(ListModelMixin, CreateMixin):
-    pass
-
-
-class ReadUpdateMixin(RetrieveMixin, UpdateMixin):
-    pass
-
-
-class RetrieveDestroyMixin(RetrieveMixin, DestroyMixin):
-    pass
-
-
-class RetrieveUpdateDestroyMixin(RetrieveMixin, UpdateMixin, DestroyMixin):
-    pass
-
-
-class CacheMixin(
-    ListMixin, CreateMixin, RetrieveMixin, UpdateMixin, DestroyMixin
-):
-    pass
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+from hashlib import md5
+from time import time_ns
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from adrf import mixins
+from adrf.viewsets import GenericViewSet
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .cache import (
+    CacheEntry, CompactCodec, acoalesce, chunk_keys, get_manifest, join_entry, pack_entry,
+    revalidate, split_entry, stale_timeout, unpack_entry,
+)
+from ..drf.utils import IGNORED_QUERY_PARAMS, get_request_cache_path
+
+
+async def generate_cache_key(view):
+    return view.get_cache_namespace()
+
+
+async def generate_request_cache_key(request, view):
+    return md5(get_request_cache_path(request, view).encode()).hexdigest()
+
+
+async def generate_page_cache_key(view, cache_key, request):
+    generation = await get_cache_generation(cache_key, get_cache(view))
+    return f"{cache_key}:page:{generation}:{await generate_request_cache_key(request, view)}"
+
+
+async def get_cache_generation(cache_key, backend=cache):
+    # Every list page key embeds the current generation of its model, so bumping
+    # the counter makes all cached pages unreachable at once. The counter starts
+    # from a timestamp so that an evicted counter never resurrects old pages.
+    generation_key = f"{cache_key}:generation"
+    generation = await backend.aget(generation_key)
+    if generation is None:
+        await backend.aadd(generation_key, time_ns(), None)
+        generation = await backend.aget(generation_key)
+    return generation
+
+
+async def bump_cache_generation(cache_key, backend=cache):
+    generation_key = f"{cache_key}:generation"
+    try:
+        await backend.aincr(generation_key)
+    except ValueError:
+        await backend.aadd(generation_key, time_ns(), None)
+
+
+# Cached in place of an item that doesn't exist, see `cache_not_found_ttl`.
+NOT_FOUND = "adrf:not-found"
+
+
+@lru_cache(maxsize=None)
+def hash_name(name):
+    return md5(name.lower().encode()).hexdigest()
+
+
+def get_cache(view):
+    return caches[view.cache_alias]
+
+
+def pk_might_exist(view, pk):
+    """
+    Checks `pk` against the `cache_pk_index` of the view, if any. A pk the
+    model field can't even parse doesn't exist either.
+    """
+    index = view.cache_pk_index
+    if index is None:
+        return True
+    model = view.get_queryset().model
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        return False
+    return index.might_exist(pk, model._default_manager.all())
+
+
+def add_to_pk_index(view, pk):
+    if view.cache_pk_index is not None:
+        view.cache_pk_index.add(view.get_queryset().model._meta.pk.to_python(pk))
+
+
+# The helpers below read through and write through the optional in-process
+# `cache_local` tier of a view before falling back to its Django cache, unless
+# reads pass `use_local=False`. Writes default to the `cache_item_ttl` of the view.
+
+async def aget_cached(view, key, use_local=True):
+    local = view.cache_local if use_local else None
+    entry = None if local is None else local.get(key)
+    if entry is None:
+        entry = await get_cache(view).aget(key)
+        if get_manifest(entry) is not None:
+            entry = (await ajoin_chunks(view, {key: entry})).get(key)
+        entry = decode_entry(view, entry)
+        if local is not None and entry is not None:
+            local.set(key, entry)
+    return unpack_entry(entry)
+
+
+async def aget_many_cached(view, keys):
+    entries = await _aget_entries(view, keys)
+    return {key: unpack_entry(entry)[0] for key, entry in entries.items()}
+
+
+async def aget_item_cached(view, key, use_local=True):
+    """
+    Returns a cached item, its ETag and whether it is stale, reading both
+    with a single cache operation.
+    """
+    etag_key = get_etag_key(key)
+    entries = await _aget_entries(view, [key, etag_key], use_local)
+    data, stale = unpack_entry(entries.get(key))
+    etag = unpack_entry(entries.get(etag_key))[0]
+    if data is not None and etag is None:
+        etag = get_etag(data)
+    return data, etag, stale
+
+
+async def _aget_entries(view, keys, use_local=True):
+    local = view.cache_local if use_local else None
+    keys = list(keys)
+    entries = {} if local is None else local.get_many(keys)
+    missing = [key for key in keys if key not in entries]
+    if missing:
+        fetched = await ajoin_chunks(view, await get_cache(view).aget_many(missing))
+        fetched = {key: decode_entry(view, entry) for key, entry in fetched.items()}
+        fetched = {key: entry for key, entry in fetched.items() if entry is not None}
+        if local is not None:
+            local.set_many(fetched)
+        entries.update(fetched)
+    return {key: entries[key] for key in keys if key in entries}
+
+
+async def aset_cached(view, key, value, timeout=DEFAULT_TIMEOUT):
+    await aset_many_cached(view, {key: value}, timeout)
+
+
+async def aset_items_cached(view, items):
+    """
+    Caches serialized items along with their ETag, so that conditional
+    requests can be answered without reading the items. Returns the ETags.
+    """
+    etags = {key: get_etag(item) for key, item in items.items()}
+    await aset_many_cached(view, items, etags=etags)
+    return etags
+
+
+async def aset_many_cached(view, data, timeout=DEFAULT_TIMEOUT, etags=None):
+    entries = dict(data)
+    changed = list(data)
+    if etags:
+        entries.update({get_etag_key(key): etag for key, etag in etags.items()})
+        if view.cache_rendered:
+            changed = await _aget_changed_keys(view, etags)
+    await _aset_entries(view, entries, timeout)
+    if view.cache_rendered and changed:
+        await _adelete_entries(view, [
+            get_rendered_cache_key(key, format)
+            for key in changed for format in view.cache_rendered_formats
+        ])
+
+
+async def _aget_changed_keys(view, etags):
+    # The rendered variants of an item stay valid as long as its ETag, which
+    # is read from the shared cache, the local tier may lag other processes.
+    etag_keys = {key: get_etag_key(key) for key in etags}
+    cached = await get_cache(view).aget_many(etag_keys.values())
+    return [
+        key for key, etag_key in etag_keys.items()
+        if unpack_entry(decode_entry(view, cached.get(etag_key)))[0] != etags[key]
+    ]
+
+
+async def _aset_entries(view, data, timeout):
+    backend, stale_ttl = get_cache(view), view.cache_stale_ttl
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = view.cache_item_ttl
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = backend.default_timeout
+    data = {key: pack_entry(value, timeout, stale_ttl) for key, value in data.items()}
+    timeout = stale_timeout(timeout, stale_ttl)
+    encoded = {key: encode_entry(view, entry) for key, entry in data.items()}
+    if view.cache_max_value_size is not None:
+        for key, entry in list(encoded.items()):
+            encoded[key], chunks = split_entry(key, entry, view.cache_max_value_size)
+            encoded.update(chunks)
+    await backend.aset_many(encoded, timeout)
+    if view.cache_local is not None:
+        view.cache_local.set_many(data, timeout)
+
+
+def encode_entry(view, entry):
+    # The local tier keeps decoded entries, only the Django cache sees the codec.
+    codec = view.cache_codec
+    if codec is None:
+        return entry
+    if isinstance(entry, CacheEntry):
+        return entry._replace(value=codec.encode(entry.value))
+    return codec.encode(entry)
+
+
+async def ajoin_chunks(view, entries):
+    """
+    Replaces the chunked entries among `entries` by their reassembled value,
+    fetching the chunks of all of them with one `aget_many`. Entries missing
+    a chunk are dropped.
+    """
+    manifests = {key: get_manifest(entry) for key, entry in entries.items()}
+    manifests = {key: manifest for key, manifest in manifests.items() if manifest is not None}
+    if not manifests:
+        return entries
+    chunks = await get_cache(view).aget_many([
+        chunk_key for key, manifest in manifests.items() for chunk_key in chunk_keys(key, manifest)
+    ])
+    entries = dict(entries)
+    for key in manifests:
+        entry = join_entry(key, entries[key], chunks)
+        if entry is None:
+            del entries[key]
+        else:
+            entries[key] = entry
+    return entries
+
+
+def decode_entry(view, entry):
+    # An entry the codec can't decode reads as a miss.
+    codec = view.cache_codec
+    if codec is None:
+        return entry
+    if isinstance(entry, CacheEntry):
+        value = codec.decode(entry.value)
+        return None if value is None else entry._replace(value=value)
+    return codec.decode(entry)
+
+
+async def adelete_cached(view, key):
+    keys = [key, get_etag_key(key)]
+    if view.cache_rendered:
+        keys += [get_rendered_cache_key(key, format) for format in view.cache_rendered_formats]
+    await _adelete_entries(view, keys)
+
+
+async def _adelete_entries(view, keys):
+    if view.cache_local is not None:
+        for key in keys:
+            view.cache_local.delete(key)
+    await get_cache(view).adelete_many(keys)
+
+
+def get_etag_key(cache_key):
+    return f"{cache_key}:etag"
+
+
+def get_etag(data):
+    """
+    Returns a weak ETag hashing the serialized `data`, shared by all of its
+    rendered formats.
+    """
+    content = json.dumps(data, cls=JSONEncoder, separators=(",", ":"))
+    return f'W/"{md5(content.encode()).hexdigest()}"'
+
+
+def etag_matches(request, etag, header="If-None-Match"):
+    header = request.headers.get(header)
+    if not header or etag is None:
+        return False
+    etags = parse_etags(header)
+    # The ETags hash the data rather than one of its representations, so they
+    # are weak and compared as such. For If-Match, this deviates from the
+    # strong comparison of RFC 9110, under which a weak ETag never matches.
+    return "*" in etags or any(
+        tag.removeprefix("W/") == etag.removeprefix("W/") for tag in etags
+    )
+
+
+def not_modified(etag):
+    return HttpResponseNotModified(headers={"ETag": etag})
+
+
+async def acheck_if_match(view, request, cache_key):
+    """
+    Returns a 412 response when `request` carries an If-Match header that
+    doesn't match the current ETag of the item, None otherwise. The ETag is
+    read from the shared cache, the local tier may lag writes of other
+    processes. The object is only serialized when its ETag isn't cached.
+    """
+    if not request.headers.get("If-Match"):
+        return None
+    etag, stale = await aget_cached(view, get_etag_key(cache_key), use_local=False)
+    if etag is None or stale:
+        instance = await view.aget_object()
+        etag = get_etag(await get_data(view.get_serializer(instance)))
+    if etag_matches(request, etag, "If-Match"):
+        return None
+    return Response(status=status.HTTP_412_PRECONDITION_FAILED)
+
+
+def is_unchanged(view, payload, data):
+    """
+    Tells whether a PUT `payload` holds every writable field of the view and
+    no value differing from the cached representation `data`.
+    """
+    if (
+        not isinstance(payload, Mapping)
+        or not isinstance(data, Mapping)
+        or not payload.keys() <= data.keys()
+    ):
+        return False
+    fields = view.get_serializer().fields
+    writable = {name for name, field in fields.items() if not field.read_only}
+    return writable <= payload.keys() and all(data[key] == value for key, value in payload.items())
+
+
+def get_rendered_cache_key(cache_key, format):
+    return f"{cache_key}:rendered:{format}"
+
+
+def get_rendered_format(view, request):
+    """
+    Returns the negotiated format when the view caches rendered responses in
+    it, None otherwise. Media type parameters such as `indent` change the
+    output, so requests carrying them are rendered as usual.
+    """
+    renderer = getattr(request, "accepted_renderer", None)
+    if (
+        not view.cache_rendered
+        or renderer is None
+        or renderer.format not in view.cache_rendered_formats
+        or request.accepted_media_type != renderer.media_type
+    ):
+        return None
+    return renderer.format
+
+
+def render_content(view, request, data):
+    return request.accepted_renderer.render(
+        data, request.accepted_media_type, view.get_renderer_context()
+    )
+
+
+def get_rendered_response(request, content, etag):
+    renderer = request.accepted_renderer
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+    return HttpResponse(content, content_type=content_type, headers={"ETag": etag})
+
+
+async def aget_rendered_response(view, request, rendered_key):
+    rendered, stale = await aget_cached(view, rendered_key)
+    if rendered is None or stale:
+        # A stale entry is served from the data entry, which revalidates it.
+        return None
+    return get_rendered_response(request, *rendered)
+
+
+async def arender_response(view, request, rendered_key, data, etag):
+    content = render_content(view, request, data)
+    await _aset_entries(view, {rendered_key: (content, etag)}, DEFAULT_TIMEOUT)
+    return get_rendered_response(request, content, etag)
+
+
+async def aget_rendered_items(view, request, cache_key, ids, format):
+    """
+    Returns the rendered items of a list page in page order. These are the
+    entries cached by `aretrieve`, items without one are rendered from their
+    cached data and cached in turn.
+    """
+    keys = {id: get_rendered_cache_key(f"{cache_key}:{id}", format) for id in ids}
+    fragments = await aget_many_cached(view, keys.values())
+    missing = [id for id, key in keys.items() if key not in fragments]
+    if missing:
+        id_name = getattr(view.get_serializer_class(), "custom_id", "id")
+        rendered = {}
+        for item in await aget_page_items(view, cache_key, missing):
+            rendered[keys[item[id_name]]] = (render_content(view, request, item), get_etag(item))
+        await _aset_entries(view, rendered, DEFAULT_TIMEOUT)
+        fragments.update(rendered)
+    return [fragments[key][0] for key in keys.values() if key in fragments]
+
+
+# Links of the pagination envelope. Requests differing in parameters that
+# aren't part of the page key share the page, so the links are cached as the
+# query parameters they set in the URL of the request, and rebuilt from the
+# URL of every request reading the page.
+PAGE_LINKS = ("next", "previous")
+
+
+def pack_envelope(request, envelope):
+    return {
+        key: get_link_params(request, value) if key in PAGE_LINKS and value else value
+        for key, value in envelope.items()
+    }
+
+
+def unpack_envelope(request, envelope):
+    return {
+        key: build_link(request, value) if key in PAGE_LINKS and value else value
+        for key, value in envelope.items()
+    }
+
+
+def get_link_params(request, link):
+    """
+    Returns the query parameters `link` sets in the URL of `request`, with
+    None for the ones it removes.
+    """
+    current = parse_qs(urlsplit(request.build_absolute_uri()).query, keep_blank_values=True)
+    linked = parse_qs(urlsplit(link).query, keep_blank_values=True)
+    params = {key: values[-1] for key, values in linked.items() if current.get(key) != values}
+    params.update({key: None for key in current if key not in linked})
+    return params
+
+
+def build_link(request, params):
+    url = request.build_absolute_uri()
+    for key, value in params.items():
+        if value is None:
+            url = remove_query_param(url, key)
+        else:
+            url = replace_query_param(url, key, value)
+    return url
+
+
+def render_page(view, request, envelope, items):
+    """
+    Splices rendered JSON items into the rendered pagination envelope.
+    """
+    results = b"[" + b",".join(items) + b"]"
+    if envelope is None:
+        return results
+    placeholder = uuid4().hex
+    content = render_content(view, request, {**envelope, "results": placeholder})
+    return content.replace(f'"{placeholder}"'.encode(), results, 1)
+
+
+async def aget_page_items(view, cache_key, ids):
+    """
+    Returns the cached items of a list page in page order. Items evicted from
+    the cache are fetched with a single query, serialized and cached again,
+    instead of being dropped from the page.
+    """
+    keys = {id: f"{cache_key}:{id}" for id in ids}
+    items = await aget_many_cached(view, keys.values())
+    # A cached 404 is refetched like an evicted item, which drops it.
+    items = {key: item for key, item in items.items() if item != NOT_FOUND}
+    missing = [id for id, key in keys.items() if key not in items]
+    if missing:
+        id_name = getattr(view.get_serializer_class(), "custom_id", "id")
+        queryset = view.filter_queryset(view.get_queryset()).filter(**{f"{id_name}__in": missing})
+        serializer = view.get_serializer([instance async for instance in queryset], many=True)
+        fetched = {
+            f"{cache_key}:{item[id_name]}": item for item in await get_data(serializer)
+        }
+        await aset_items_cached(view, fetched)
+        items.update(fetched)
+    return [items[key] for key in keys.values() if key in items]
+
+
+async def get_data(serializer):
+    try:
+        data = await serializer.adata
+    except Exception:
+        data = await sync_to_async(getattr)(serializer, 'data')
+    return data
+
+
+class CacheOptionsMixin:
+    """
+    Cache settings shared by every cached mixin, override them on the view.
+
+    `cache_alias` selects the Django cache, `cache_item_ttl` and
+    `cache_page_ttl` are the timeouts of single objects and of list pages,
+    and `cache_key_prefix` namespaces all keys of the view. Set
+    `cache_stale_ttl` to keep serving expired entries for that many more
+    seconds while they are rebuilt in the background, `cache_local` to a
+    `LocalCache` to serve hot entries from process memory, and
+    `cache_lock_timeout` to coalesce rebuilds across processes.
+    `cache_codec` encodes the entries written to the Django cache, set it to
+    a `ZlibCodec` to compress large entries or to None to let the backend
+    pickle them as is. Entries larger than `cache_max_value_size` bytes are
+    split into chunks stored under separate keys, e.g. to fit the 1 MB item
+    limit of memcached. With `cache_not_found_ttl` set, retrieving a missing
+    object caches the 404 for that many seconds, and `cache_pk_index` can be
+    set to a `PkIndex` to reject pks that don't exist before reading the
+    cache.
+
+    List pages are keyed by a canonical query string, made of the parameters
+    consumed by the filter backends and paginator (or `cache_query_params`)
+    minus the `cache_ignored_query_params` patterns.
+
+    Retrieve and list responses carry an ETag hashing their data, which is
+    cached next to it, and a matching `If-None-Match` is answered with a 304
+    from that ETag alone.
+
+    With `cache_rendered` enabled, retrieve also caches the rendered body
+    (for the `cache_rendered_formats` JSON renderers) with an ETag, and a hit
+    returns it as is, without serializing or rendering anything. List hits
+    are spliced together from these rendered items.
+    """
+    cache_alias = DEFAULT_CACHE_ALIAS
+    cache_item_ttl = DEFAULT_TIMEOUT
+    cache_page_ttl = 100
+    cache_key_prefix = ""
+    cache_stale_ttl = None
+    cache_local = None
+    cache_lock_timeout = None
+    cache_codec = CompactCodec()
+    cache_max_value_size = None
+    cache_not_found_ttl = None
+    cache_pk_index = None
+    cache_query_params = None
+    cache_ignored_query_params = IGNORED_QUERY_PARAMS
+    cache_rendered = False
+    cache_rendered_formats = ("json",)
+
+    def get_cache_namespace(self):
+        # Derived once per view instance: `as_view()` initkwargs can give two
+        # routes of the same class another serializer or key prefix.
+        namespace = self.__dict__.get("_cache_namespace")
+        if namespace is None:
+            namespace = self._cache_namespace = self._generate_cache_namespace()
+        return namespace
+
+    def _generate_cache_namespace(self):
+        namespace = hash_name(self.get_serializer_class().Meta.model.__name__)
+        if self.cache_key_prefix:
+            namespace = f"{self.cache_key_prefix}:{namespace}"
+        return namespace
+
+
+class ListModelMixin(CacheOptionsMixin, mixins.ListModelMixin):
+    async def alist(self, request, *args, **kwargs):
+        cache_key = await generate_cache_key(self)
+        cache_key_page = await generate_page_cache_key(self, cache_key, request)
+        format = get_rendered_format(self, request)
+        entry = await self._aget_page_entry(cache_key, cache_key_page)
+        if entry is not None:
+            if etag_matches(request, entry["etag"]):
+                return not_modified(entry["etag"])
+            if format is not None:
+                content = await self._arender_page(request, cache_key, entry, format)
+                return get_rendered_response(request, content, entry["etag"])
+            data, etag = await self._aget_page_data(cache_key, entry), entry["etag"]
+        else:
+            data, etag = await acoalesce(
+                get_cache(self), cache_key_page,
+                lambda: self._abuild_page(cache_key, cache_key_page),
+                lambda: self._aget_cached_page(cache_key, cache_key_page),
+                self.cache_lock_timeout,
+            )
+        if format is not None:
+            return get_rendered_response(request, render_content(self, request, data), etag)
+        return Response(data, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+    async def _abuild_page(self, cache_key, cache_key_page):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        serializer = self.get_serializer(queryset if page is None else page, many=True)
+        id_name = getattr(self.get_serializer_class(), "custom_id", "id")
+        data = await get_data(serializer)
+        data_ids, cached_data = [], {}
+        for item in data:
+            cached_data[f"{cache_key}:{item[id_name]}"] = item
+            data_ids.append(item[id_name])
+        # The pagination envelope is cached with the ids, so that a hit can be
+        # answered without paginating again.
+        envelope = None
+        if page is not None:
+            data = (await self.get_apaginated_response(data)).data
+            envelope = pack_envelope(self.request, {
+                key: value for key, value in data.items() if key != "results"
+            })
+        etag = get_etag(data)
+        await aset_items_cached(self, cached_data)
+        await aset_cached(
+            self, cache_key_page, {"ids": data_ids, "envelope": envelope, "etag": etag},
+            self.cache_page_ttl,
+        )
+        return data, etag
+
+    async def _aget_cached_page(self, cache_key, cache_key_page):
+        entry = await self._aget_page_entry(cache_key, cache_key_page)
+        if entry is None:
+            return None
+        return await self._aget_page_data(cache_key, entry), entry["etag"]
+
+    async def _aget_page_data(self, cache_key, entry):
+        data = await aget_page_items(self, cache_key, entry["ids"])
+        if entry["envelope"] is None:
+            return data
+        return {**unpack_envelope(self.request, entry["envelope"]), "results": data}
+
+    async def _arender_page(self, request, cache_key, entry, format):
+        items = await aget_rendered_items(self, request, cache_key, entry["ids"], format)
+        envelope = entry["envelope"]
+        if envelope is not None:
+            envelope = unpack_envelope(request, envelope)
+        return render_page(self, request, envelope, items)
+
+    async def _aget_page_entry(self, cache_key, cache_key_page):
+        entry, stale = await aget_cached(self, cache_key_page)
+        if stale:
+            revalidate(cache_key_page, lambda: self._abuild_page(cache_key, cache_key_page))
+        return entry
+
+
+class RetrieveModelMixin(CacheOptionsMixin, mixins.RetrieveModelMixin):
+    async def aretrieve(self, request, *args, **kwargs):
+        if not pk_might_exist(self, self.kwargs["pk"]):
+            raise Http404
+        cache_key = f"{await generate_cache_key(self)}:{self.kwargs['pk']}"
+        if "If-None-Match" in request.headers:
+            # Only the ETag is read, not the item.
+            etag, stale = await aget_cached(self, get_etag_key(cache_key))
+            if stale:
+                revalidate(cache_key, lambda: self._abuild_item(cache_key))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+        format = get_rendered_format(self, request)
+        rendered_key = None if format is None else get_rendered_cache_key(cache_key, format)
+        if rendered_key is not None:
+            response = await aget_rendered_response(self, request, rendered_key)
+            if response is not None:
+                return response
+        cached = await self._aget_cached_item(cache_key)
+        if cached is None:
+            cached = await acoalesce(
+                get_cache(self), cache_key,
+                lambda: self._abuild_item(cache_key),
+                lambda: self._aget_cached_item(cache_key),
+                self.cache_lock_timeout,
+            )
+        data, etag = cached
+        if rendered_key is not None:
+            return await arender_response(self, request, rendered_key, data, etag)
+        return Response(data, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+    async def _abuild_item(self, cache_key):
+        try:
+            instance = await self.aget_object()
+        except Http404:
+            # Creating the object overwrites the entry.
+            if self.cache_not_found_ttl:
+                await aset_cached(self, cache_key, NOT_FOUND, self.cache_not_found_ttl)
+            raise
+        data = await get_data(self.get_serializer(instance, many=False))
+        etags = await aset_items_cached(self, {cache_key: data})
+        return data, etags[cache_key]
+
+    async def _aget_cached_item(self, cache_key):
+        data, etag, stale = await aget_item_cached(self, cache_key)
+        if data == NOT_FOUND:
+            if stale:
+                return None
+            raise Http404
+        if stale:
+            revalidate(cache_key, lambda: self._abuild_item(cache_key))
+        return None if data is None else (data, etag)
+
+
+class CreateModelMixin(CacheOptionsMixin, mixins.CreateModelMixin):
+    async def acreate(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await self.perform_acreate(serializer)
+        data = await get_data(serializer)
+        headers = self.get_success_headers(data)
+        id_name = getattr(self.serializer_class, "custom_id", "id")
+        cache_key = await generate_cache_key(self)
+        await aset_items_cached(self, {f"{cache_key}:{data[id_name]}": data})
+        await bump_cache_generation(cache_key, get_cache(self))
+        add_to_pk_index(self, serializer.instance.pk)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class UpdateModelMixin(CacheOptionsMixin, mixins.UpdateModelMixin):
+    async def aupdate(self, request, *args, **kwargs):
+        cache_key = await generate_cache_key(self)
+        cache_key_id = f"{cache_key}:{self.kwargs['pk']}"
+        response = await acheck_if_match(self, request, cache_key_id)
+        if response is not None:
+            return response
+        if not kwargs.get("partial", False):
+            response = await self._aget_unchanged_response(request, cache_key_id)
+            if response is not None:
+                return response
+        response = await mixins.UpdateModelMixin.aupdate(self, request, *args, **kwargs)
+        etags = await aset_items_cached(self, {cache_key_id: response.data})
+        await bump_cache_generation(cache_key, get_cache(self))
+        response["ETag"] = etags[cache_key_id]
+        return response
+
+    async def _aget_unchanged_response(self, request, cache_key):
+        # A PUT resending the cached representation is answered without
+        # saving anything. The object is still fetched, for its permissions.
+        # The local tier may lag writes of other processes, it isn't read.
+        data, etag, stale = await aget_item_cached(self, cache_key, use_local=False)
+        if data is None or stale or not is_unchanged(self, request.data, data):
+            return None
+        await self.aget_object()
+        return Response(data, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+
+class DestroyModelMixin(CacheOptionsMixin, mixins.DestroyModelMixin):
+    async def adestroy(self, request, *args, **kwargs):
+        cache_key = await generate_cache_key(self)
+        cache_key_id = f"{cache_key}:{self.kwargs['pk']}"
+        response = await acheck_if_match(self, request, cache_key_id)
+        if response is not None:
+            return response
+        response = await mixins.DestroyModelMixin.adestroy(self, request, *args, **kwargs)
+        await adelete_cached(self, cache_key_id)
+        await bump_cache_generation(cache_key, get_cache(self))
+        return response
+
+
+class ReadOnlyModelViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+    """
+    A viewset that provides default asynchronous `list()` and `retrieve()` actions.
+    """
+    pass
+
+
+class CachedModelViewSet(
+    CreateModelMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    UpdateModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
+):
+    """
+    A viewset that provides default asynchronous `create()`, `retrieve()`, `update()`,
+    `partial_update()`, `destroy()` and `list()` actions.
+
+    See `CacheOptionsMixin` for the cache settings.
+    """
+    pass
+
+
+class CacheMixinBase(CacheOptionsMixin):
+    async def _generate_cache_key(self):
+        return self.get_cache_namespace()
+
+    def _generate_cache_namespace(self):
+        namespace = hash_name(self.__class__.__name__)
+        if self.cache_key_prefix:
+            namespace = f"{self.cache_key_prefix}:{namespace}"
+        return namespace
+
+    async def _generate_request_cache_key(self, request):
+        cache_key = md5(get_request_cache_path(request, self).encode()).hexdigest()
+        if isinstance(self, Owned):
+            cache_key = f'{cache_key}:{md5(str(request.user.id).encode()).hexdigest()}'
+        return cache_key
+
+    async def _generate_page_cache_key(self, request):
+        cache_key = await self._generate_cache_key()
+        generation = await get_cache_generation(cache_key, get_cache(self))
+        return f"{cache_key}:page:{generation}:{await self._generate_request_cache_key(request)}"
+
+
+class ListMixin(CacheMixinBase):
+    async def get(self, request, *args, **kwargs):
+        cache_key_page = await self._generate_page_cache_key(request)
+        cache_key = await self._generate_cache_key()
+        paginator, paginator_cls = None, getattr(self, "pagination_class", None)
+        if paginator_cls:
+            paginator = paginator_cls()
+            paginator.request = request
+            if "LimitOffset" in paginator_cls.__name__:
+                paginator.offset = paginator.get_offset(request)
+                paginator.limit = paginator.get_limit(request)
+
+        cached_ids, stale = await aget_cached(self, cache_key_page)
+        if cached_ids is None:
+            return await self._abuild_page(request, cache_key, cache_key_page, paginator)
+
+        data = tuple(await aget_page_items(self, cache_key, cached_ids))
+        if paginator_cls:
+            if "LimitOffset" in paginator_cls.__name__:
+                paginator.count = await self.get_queryset().acount()
+            else:
+                paginator.page = data
+            response = await sync_to_async(paginator.get_paginated_response)(data)
+        else:
+            response = Response(data)
+        if stale:
+            # The paginator above is done with, the rebuild gets its own one.
+            revalidate(cache_key_page, lambda: self._abuild_page(
+                request, cache_key, cache_key_page,
+                paginator_cls and paginator_cls(),
+            ))
+        return response
+
+    async def _abuild_page(self, request, cache_key, cache_key_page, paginator):
+        queryset = self.filter_queryset(self.get_queryset())
+        data = await sync_to_async(getattr)(self.get_serializer(
+            queryset if not paginator else await paginator.paginate_queryset(
+                queryset, request, view=self
+            ), many=True
+        ), 'data')
+        id_name = getattr(self.serializer_class, "custom_id", "id")
+        items = data.get("results", data) if isinstance(data, dict) else data
+        data_ids, cached_data = [], {}
+        for item in items:
+            cached_data[f"{cache_key}:{item[id_name]}"] = item
+            data_ids.append(item[id_name])
+        await aset_many_cached(self, cached_data)
+        await aset_cached(self, cache_key_page, data_ids, self.cache_page_ttl)
+        return await sync_to_async(paginator.get_paginated_response)(data)
+
+
+class CreateMixin(CacheMixinBase):
+    async def post(self, request, *args, **kwargs):
+        resp = await self.acreate(request, *args, **kwargs)
+        id_name = getattr(self.serializer_class, "custom_id", "id")
+        cache_key = await self._generate_cache_key()
+        await aset_cached(self, f"{cache_key}:{resp.data[id_name]}", resp.data)
+        await bump_cache_generation(cache_key, get_cache(self))
+        add_to_pk_index(self, resp.data[id_name])
+        return resp
+
+
+class RetrieveMixin(CacheMixinBase):
+    async def retrieve(self, request, *args, **kwargs):
+        if not pk_might_exist(self, self.kwargs["pk"]):
+            raise Http404
+        cache_key = f"{await self._generate_cache_key()}:{self.kwargs['pk']}"
+        data, stale = await aget_cached(self, cache_key)
+        if data is None:
+            return Response(await self._abuild_item(cache_key))
+        if stale:
+            revalidate(cache_key, lambda: self._abuild_item(cache_key))
+        return Response(data)
+
+    async def _abuild_item(self, cache_key):
+        serializer = self.get_serializer()
+        data = await sync_to_async(
+            serializer.to_representation
+        )(await self.aget_object())
+        await aset_cached(self, cache_key, data)
+        return data
+
+
+class UpdateMixin(CacheMixinBase):
+    async def aupdate(self, request, *args, **kwargs):
+        partial = kwargs.pop("partial", False)
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await serializer.asave()
+        if getattr(instance, "_prefetched_objects_cache", None):
+            instance._prefetched_objects_cache = {}
+        return Response(
+            await sync_to_async(getattr)(serializer, 'data'),
+            status=status.HTTP_200_OK
+        )
+
+    async def patch(self, request, *args, **kwargs):
+        cache_key = await self._generate_cache_key()
+        kwargs["partial"] = True
+        resp = await self.aupdate(request, *args, **kwargs)
+        await aset_cached(self, f"{cache_key}:{self.kwargs['pk']}", resp.data)
+        await bump_cache_generation(cache_key, get_cache(self))
+        return resp
+
+    async def put(self, request, *args, **kwargs):
+        cache_key = await self._generate_cache_key()
+        resp = await self.aupdate(request, *args, **kwargs)
+        await aset_cached(self, f"{cache_key}:{self.kwargs['pk']}", resp.data)
+        await bump_cache_generation(cache_key, get_cache(self))
+        return resp
+
+
+class DestroyMixin(CacheMixinBase):
+    async def delete(self, request, *args, **kwargs):
+        cache_key = await self._generate_cache_key()
+        instance = await self.aget_object()
+        await instance.adelete()
+        resp = Response(status=status.HTTP_204_NO_CONTENT)
+        cache_key_id = f"{cache_key}:{self.kwargs['pk']}"
+        await adelete_cached(self, cache_key_id)
+        await bump_cache_generation(cache_key, get_cache(self))
+        return resp
+
+
+class ListCreateMixin(ListModelMixin, CreateMixin):
+    pass
+
+
+class ReadUpdateMixin(RetrieveMixin, UpdateMixin):
+    pass
+
+
+class RetrieveDestroyMixin(RetrieveMixin, DestroyMixin):
+    pass
+
+
+class RetrieveUpdateDestroyMixin(RetrieveMixin, UpdateMixin, DestroyMixin):
+    pass
+
+
+class CacheMixin(
+    ListMixin, CreateMixin, RetrieveMixin, UpdateMixin, DestroyMixin
+):
+    pass
@@ -1,71 +1,339 @@
-import asyncio
-from asgiref.sync import sync_to_async
-from collections import OrderedDict
-from asgiref.sync import sync_to_async
-from django.db.models import Model
-from django.core.cache import cache
-from django.core.exceptions import ValidationError as DjangoValidationError
-from rest_framework.exceptions import ValidationError
-from rest_framework.fields import SkipField
-from rest_framework.fields import empty
-from rest_framework import serializers as drf_serializers
-
-
-class AsyncSerializerMixin:
-    async def ais_valid(self, *, raise_exception=False):
-        assert hasattr(self, "initial_data"), (
-            "Cannot call `.is_valid()` as no `data=` keyword argument was "
-            "passed when instantiating the serializer instance."
-        )
-        if not hasattr(self, "_validated_data"):
-            try:
-                self._validated_data = await self.arun_validation(self.initial_data)
-            except ValidationError as exc:
-                self._validated_data = {}
-                self._errors = exc.detail
-            else:
-                self._errors = {}
-        if self._errors and raise_exception:
-            raise ValidationError(self.errors)
-        return not bool(self._errors)
-
-    async def arun_validation(self, data=empty):
-        (is_empty_value, data) = self.validate_empty_values(data)
-        if is_empty_value:
-            return data
-        value = self.to_internal_value(data)
-        try:
-            self.run_validators(value)
-            value = await self.avalidate(value)
-            assert value is not None, ".validate() should return the validated data"
-        except (ValidationError, DjangoValidationError) as exc:
-            raise ValidationError(detail=drf_serializers.as_serializer_error(exc))
-        return value
-
-    async def ato_representation(self, instance):
-        ret = OrderedDict()
-        fields = self._readable_fields
-
-        for field in fields:
-            try:
-                attribute = await sync_to_async(field.get_attribute)(instance)
-            except SkipField:
-                continue
-
-            check_for_none = (
-                attribute.pk if isinstance(attribute, Model) else attribute
-            )
-            if check_for_none is None:
-                ret[field.field_name] = None
-            else:
-                if asyncio.iscoroutinefunction(
-                    getattr(field, "ato_representation", None)
-                ):
-                    repr = await field.ato_representation(attribute)
-                else:
-                    # Use sync_to_async to make synchronous operations async-safe
-                    repr = await sync_to_async(field.to_representation)(attribute)
-
-                ret[field.field_name] = repr
-
-        return ret
+import asyncio
+import keyword
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from collections.abc import Mapping
+from operator import attrgetter
+from typing import Any, Callable, NamedTuple, Optional
+from asgiref.sync import sync_to_async
+from django.db.models import Model, QuerySet
+from django.db.models.manager import BaseManager
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import (
+    CharField, Field, FloatField, IntegerField, ReadOnlyField, SkipField,
+)
+from rest_framework.fields import empty
+from rest_framework import serializers as drf_serializers
+from rest_framework.utils.serializer_helpers import ReturnList
+from .loaders import get_model_loader
+
+
+def is_async_field(field):
+    return asyncio.iscoroutinefunction(getattr(field, "ato_representation", None))
+
+
+class FieldStep(NamedTuple):
+    field: Any
+    name: str
+    getter: Optional[Callable]
+    is_async: bool
+
+
+def get_field_step(field):
+    # Fields keeping the stock `get_attribute` read their source chain with a
+    # plain `attrgetter`, anything unusual is left to `get_attribute`.
+    getter = None
+    if type(field).get_attribute is Field.get_attribute and field.source != "*":
+        getter = attrgetter(".".join(field.source_attrs))
+    return FieldStep(field, field.field_name, getter, is_async_field(field))
+
+
+def read_attribute(step, instance):
+    if step.getter is not None and not isinstance(instance, Mapping):
+        try:
+            value = step.getter(instance)
+        except (AttributeError, ObjectDoesNotExist):
+            pass
+        else:
+            if not callable(value):
+                return value
+    return step.field.get_attribute(instance)
+
+
+# Conversions inlined by `compile_representation`, other fields are represented
+# by calling their `to_representation`.
+INLINED_CONVERSIONS = {
+    CharField.to_representation: "str(value)",
+    IntegerField.to_representation: "int(value)",
+    FloatField.to_representation: "float(value)",
+    ReadOnlyField.to_representation: "value",
+}
+
+_compiled_factories = {}
+
+
+def compile_to_representation(serializer):
+    """
+    Returns a `to_representation(instance)` function specialized for the
+    fields of a flat `ModelSerializer`, or None when one of its readable
+    fields isn't a sync field reading a concrete, non relational model field.
+
+    The source is generated and compiled once per serializer class and set
+    of fields; the returned function is bound to the fields of `serializer`.
+    """
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+    columns = []
+    for step in serializer.get_field_plan():
+        field, attr = step.field, step.field.source
+        if (
+            step.is_async
+            or step.getter is None
+            or isinstance(field, drf_serializers.BaseSerializer)
+            or not attr.isidentifier()
+            or keyword.iskeyword(attr)
+        ):
+            return None
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.is_relation:
+            return None
+        columns.append((step.name, attr, INLINED_CONVERSIONS.get(type(field).to_representation)))
+
+    key = (type(serializer), tuple(columns))
+    factory = _compiled_factories.get(key)
+    if factory is None:
+        factory = _compiled_factories[key] = _compile_factory(columns)
+    converters = [step.field.to_representation for step in serializer.get_field_plan()]
+    return factory(OrderedDict, converters)
+
+
+def _compile_factory(columns):
+    lines = ["def factory(OrderedDict, converters):"]
+    for index, (_, _, inlined) in enumerate(columns):
+        if inlined is None:
+            lines.append(f"    convert_{index} = converters[{index}]")
+    lines += ["    def to_representation(instance):", "        ret = OrderedDict()"]
+    for index, (name, attr, inlined) in enumerate(columns):
+        lines += [
+            f"        value = instance.{attr}",
+            f"        ret[{name!r}] = None if value is None else "
+            f"{inlined or f'convert_{index}(value)'}",
+        ]
+    lines += ["        return ret", "    return to_representation"]
+    namespace = {}
+    exec(compile("\n".join(lines), "<compiled representation>", "exec"), namespace)
+    return namespace["factory"]
+
+
+class AsyncSerializerMixin:
+    # Read and represent every field without an async `ato_representation` in
+    # a single `sync_to_async` call per instance, instead of two per field.
+    batch_sync_fields = False
+    # Represent flat model serializers with a generated function, in a single
+    # `sync_to_async` call per instance, see `compile_to_representation`.
+    compile_representation = False
+    # Instances represented concurrently by an `AsyncListSerializer`.
+    list_concurrency = 10
+
+    def get_compiled_representation(self):
+        if "_compiled_representation" not in self.__dict__:
+            self._compiled_representation = compile_to_representation(self)
+        return self._compiled_representation
+
+    def get_field_plan(self):
+        """
+        Returns the readable fields with how to read and represent them,
+        computed once per serializer. Fields are bound to the serializer
+        instance, and a `many=True` serializer reuses its child for every
+        instance.
+        """
+        plan = self.__dict__.get("_field_plan")
+        if plan is None:
+            plan = self._field_plan = tuple(map(get_field_step, self._readable_fields))
+        return plan
+
+    async def ais_valid(self, *, raise_exception=False):
+        assert hasattr(self, "initial_data"), (
+            "Cannot call `.is_valid()` as no `data=` keyword argument was "
+            "passed when instantiating the serializer instance."
+        )
+        if not hasattr(self, "_validated_data"):
+            try:
+                self._validated_data = await self.arun_validation(self.initial_data)
+            except ValidationError as exc:
+                self._validated_data = {}
+                self._errors = exc.detail
+            else:
+                self._errors = {}
+        if self._errors and raise_exception:
+            raise ValidationError(self.errors)
+        return not bool(self._errors)
+
+    async def arun_validation(self, data=empty):
+        (is_empty_value, data) = self.validate_empty_values(data)
+        if is_empty_value:
+            return data
+        value = self.to_internal_value(data)
+        try:
+            self.run_validators(value)
+            value = await self.avalidate(value)
+            assert value is not None, ".validate() should return the validated data"
+        except (ValidationError, DjangoValidationError) as exc:
+            raise ValidationError(detail=drf_serializers.as_serializer_error(exc))
+        return value
+
+    async def ato_representation(self, instance):
+        if self.batch_sync_fields or self.compile_representation:
+            return await self._ato_representation_batched(instance)
+        ret = OrderedDict()
+
+        for step in self.get_field_plan():
+            try:
+                attribute = await sync_to_async(read_attribute)(step, instance)
+            except SkipField:
+                continue
+
+            check_for_none = (
+                attribute.pk if isinstance(attribute, Model) else attribute
+            )
+            if check_for_none is None:
+                ret[step.name] = None
+            else:
+                if step.is_async:
+                    repr = await step.field.ato_representation(attribute)
+                else:
+                    # Use sync_to_async to make synchronous operations async-safe
+                    repr = await sync_to_async(step.field.to_representation)(attribute)
+
+                ret[step.name] = repr
+
+        return ret
+
+    async def _ato_representation_batched(self, instance):
+        ret, async_fields = await sync_to_async(self._sync_representation)(instance)
+        for step, attribute in async_fields:
+            ret[step.name] = await step.field.ato_representation(attribute)
+        return ret
+
+    def _sync_representation(self, instance):
+        if self.compile_representation:
+            compiled = self.get_compiled_representation()
+            if compiled is not None:
+                return compiled(instance), ()
+        # Async fields get a placeholder, so that they keep their position.
+        ret = OrderedDict()
+        async_fields = []
+
+        for step in self.get_field_plan():
+            try:
+                attribute = read_attribute(step, instance)
+            except SkipField:
+                continue
+
+            check_for_none = (
+                attribute.pk if isinstance(attribute, Model) else attribute
+            )
+            if check_for_none is None:
+                ret[step.name] = None
+            elif step.is_async:
+                ret[step.name] = None
+                async_fields.append((step, attribute))
+            else:
+                ret[step.name] = step.field.to_representation(attribute)
+
+        return ret, async_fields
+
+
+class AsyncListSerializer(drf_serializers.ListSerializer):
+    """
+    A `ListSerializer` representing its instances concurrently, up to the
+    `list_concurrency` of its child at a time, so that the async I/O of
+    their fields overlaps. The output keeps the order of the instances.
+
+    class MySerializer(AsyncSerializerMixin, ModelSerializer):
+        class Meta:
+            model = MyModel
+            fields = "__all__"
+            list_serializer_class = AsyncListSerializer
+    """
+
+    async def ato_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        if isinstance(iterable, QuerySet):
+            instances = [instance async for instance in iterable]
+        else:
+            instances = list(iterable)
+        semaphore = asyncio.Semaphore(self.child.list_concurrency)
+
+        async def represent(instance):
+            async with semaphore:
+                return await self.child.ato_representation(instance)
+
+        return await asyncio.gather(*map(represent, instances))
+
+    @property
+    def adata(self):
+        return self._adata()
+
+    async def _adata(self):
+        if not hasattr(self, "_data"):
+            self._data = await self.ato_representation(self.instance)
+        return ReturnList(self._data, serializer=self)
+
+
+class BatchedRelatedField(drf_serializers.RelatedField):
+    """
+    A read-only relation whose related objects are fetched through a
+    request-scoped `DataLoader`: the pks requested by all the instances being
+    represented concurrently, e.g. by an `AsyncListSerializer`, are loaded
+    with one `filter(pk__in=...)` query.
+
+    The related object is represented by `serializer`, an async serializer
+    class, or as a string. `model` defaults to the related model of the
+    source on the model of the parent serializer.
+
+    Instances reach their related field a `sync_to_async` hop apart, and those
+    hops run one at a time on the same thread, so the loader waits `delay`
+    seconds for the pks of the other instances instead of a single loop tick.
+    """
+
+    def __init__(self, serializer=None, model=None, delay=0.001, **kwargs):
+        kwargs["read_only"] = True
+        self.serializer = serializer
+        self.model = model
+        self.delay = delay
+        super().__init__(**kwargs)
+
+    def use_pk_only_optimization(self):
+        # Reads the foreign key column instead of fetching the object.
+        return True
+
+    def get_related_model(self):
+        if self.model is None:
+            self.model = self.parent.Meta.model._meta.get_field(self.source).related_model
+        return self.model
+
+    def get_loader(self):
+        request = self.context.get("request")
+        owner = self.root if request is None else request
+        return get_model_loader(owner, self.get_related_model(), self.delay)
+
+    def get_child(self):
+        if "_child" not in self.__dict__:
+            self._child = self.serializer(context=self.context)
+        return self._child
+
+    async def ato_representation(self, value):
+        if value.pk is None:
+            return None
+        instance = await self.get_loader().load(value.pk)
+        if instance is None:
+            return None
+        if self.serializer is None:
+            return str(instance)
+        return await self.get_child().ato_representation(instance)
+
+    def to_representation(self, value):
+        instance = self.get_related_model()._default_manager.filter(pk=value.pk).first()
+        if instance is None:
+            return None
+        if self.serializer is None:
+            return str(instance)
+        return self.get_child().to_representation(instance)
@@ -0,0 +1,56 @@
+"""
+Compares the stock local-memory cache with `AsyncLocMemCache` on the cache
+operations of a cached list page hit: generation counter, page entry and
+one `aget_many` over the items of the page.
+
+    python -m benchmarks.cache_backends
+"""
+import asyncio
+
+from .utils import atimed, configure
+
+configure()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.core.cache.backends import base  # noqa: E402
+
+PAGE_SIZE = 100
+REQUESTS = 200
+
+hops = 0
+
+
+def counting_sync_to_async(func, **kwargs):
+    async def call(*args, **kw):
+        global hops
+        hops += 1
+        return await sync_to_async(func, **kwargs)(*args, **kw)
+
+    return call
+
+
+async def list_hit(cache):
+    await cache.aget("model:generation")
+    ids = await cache.aget("model:page")
+    await cache.aget_many([f"model:{id}" for id in ids])
+
+
+async def run(alias):
+    global hops
+    cache = caches[alias]
+    await cache.aset("model:generation", 1)
+    await cache.aset("model:page", list(range(PAGE_SIZE)))
+    await cache.aset_many({f"model:{id}": {"id": id} for id in range(PAGE_SIZE)})
+    hops = 0
+    elapsed = await atimed(lambda: list_hit(cache), REQUESTS)
+    print(
+        f"{alias:>8}: {hops / REQUESTS:6.1f} thread hops/request, "
+        f"{elapsed:8.1f} us/request"
+    )
+
+
+if __name__ == "__main__":
+    base.sync_to_async = counting_sync_to_async
+    for alias in ("locmem", "async"):
+        asyncio.run(run(alias))
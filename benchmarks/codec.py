@@ -0,0 +1,34 @@
+"""
+Reports the size against CPU trade-off of `ZlibCodec` on list pages of
+nested items: stored size, compression ratio, and the time to encode and
+decode a page at each compression level.
+
+    python -m benchmarks.codec
+"""
+import pickle
+
+from .utils import make_items, timed
+from adrf.cache import ZlibCodec
+
+REPEAT = 20
+
+
+def run(page_size, level):
+    page = make_items(page_size)
+    codec = ZlibCodec(threshold=0, level=level)
+    raw = len(pickle.dumps(page, pickle.HIGHEST_PROTOCOL))
+    encoded = codec.encode(page)
+    encode_time = timed(lambda: codec.encode(page), REPEAT)
+    decode_time = timed(lambda: codec.decode(encoded), REPEAT)
+    pickle_time = timed(lambda: pickle.loads(pickle.dumps(page, pickle.HIGHEST_PROTOCOL)), REPEAT)
+    print(
+        f"{page_size:>5} items level {level}: {raw:>9} -> {len(encoded):>8} bytes "
+        f"({raw / len(encoded):5.1f}x), encode {encode_time:9.1f} us, "
+        f"decode {decode_time:9.1f} us, pickle round trip {pickle_time:9.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    for page_size in (10, 100, 1000, 10000):
+        for level in (1, 6, 9):
+            run(page_size, level)
@@ -0,0 +1,35 @@
+"""
+Compares reading cached representations stored by `CompactCodec` with the
+pickled `OrderedDict` trees the cache backends store by default: stored
+size and decode throughput, for a single item and for list pages.
+
+    python -m benchmarks.compact_codec
+"""
+import pickle
+
+from .utils import make_items, timed
+from adrf.cache import CompactCodec
+
+REPEAT = 200
+
+
+def run(count):
+    value = make_items(count)
+    if count == 1:
+        value = value[0]
+    codec = CompactCodec()
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    encoded = pickle.dumps(codec.encode(value), pickle.HIGHEST_PROTOCOL)
+    pickle_time = timed(lambda: pickle.loads(pickled), REPEAT)
+    compact_time = timed(lambda: codec.decode(pickle.loads(encoded)), REPEAT)
+    print(
+        f"{count:>5} items: pickle {len(pickled):>8} bytes {pickle_time:9.1f} us "
+        f"({count / pickle_time * 1e6:10.0f} items/s), "
+        f"compact {len(encoded):>8} bytes {compact_time:9.1f} us "
+        f"({count / compact_time * 1e6:10.0f} items/s)"
+    )
+
+
+if __name__ == "__main__":
+    for count in (1, 10, 100, 1000):
+        run(count)
@@ -0,0 +1,66 @@
+"""
+Compares representing a page of flat model instances inside the sync
+batch of `AsyncSerializerMixin` with the generic field loop and with the
+generated function of `compile_representation`.
+
+    python -m benchmarks.compiled_representation
+"""
+from datetime import datetime, timezone
+
+from .utils import configure, timed
+
+configure(INSTALLED_APPS=["django.contrib.contenttypes"], USE_TZ=True)
+
+from django.db import models  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+
+from adrf.serializers import AsyncSerializerMixin  # noqa: E402
+
+PAGE_SIZE = 1000
+REPEAT = 20
+
+
+class Article(models.Model):
+    title = models.CharField(max_length=100)
+    slug = models.SlugField()
+    views = models.IntegerField()
+    rating = models.FloatField()
+    published = models.BooleanField()
+    created = models.DateTimeField()
+
+    class Meta:
+        app_label = "benchmarks"
+
+
+class ArticleSerializer(AsyncSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Article
+        fields = ("id", "title", "slug", "views", "rating", "published", "created")
+
+
+def run(compiled):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    instances = [
+        Article(
+            id=id, title=f"title {id}", slug=f"title-{id}", views=id, rating=id / 10,
+            published=bool(id % 2), created=created,
+        )
+        for id in range(PAGE_SIZE)
+    ]
+    serializer = ArticleSerializer()
+    serializer.compile_representation = compiled
+
+    def represent():
+        for instance in instances:
+            serializer._sync_representation(instance)
+
+    elapsed = timed(represent, REPEAT)
+    print(
+        f"{'compiled' if compiled else 'generic':>8}: {elapsed / 1000:8.2f} ms/page "
+        f"({PAGE_SIZE} instances, {len(serializer.fields)} fields)"
+    )
+
+
+if __name__ == "__main__":
+    for compiled in (False, True):
+        run(compiled)
@@ -0,0 +1,56 @@
+"""
+Measures the latency of representing a page with `AsyncListSerializer`
+when a field awaits I/O, simulated by an injected per-field latency, at
+several `list_concurrency` limits. A limit of 1 is the sequential case.
+
+    python -m benchmarks.list_concurrency
+"""
+import asyncio
+from types import SimpleNamespace
+
+from .utils import atimed, configure
+
+configure()
+
+from rest_framework import serializers  # noqa: E402
+
+from adrf.serializers import AsyncListSerializer, AsyncSerializerMixin  # noqa: E402
+
+PAGE_SIZE = 100
+LATENCY = 0.005
+REPEAT = 3
+
+
+class RemoteField(serializers.CharField):
+    async def ato_representation(self, value):
+        await asyncio.sleep(LATENCY)
+        return value
+
+
+class PageSerializer(AsyncSerializerMixin, serializers.Serializer):
+    name = serializers.CharField()
+    remote = RemoteField()
+
+    class Meta:
+        list_serializer_class = AsyncListSerializer
+
+
+async def run(concurrency):
+    instances = [
+        SimpleNamespace(name=f"name {id}", remote=f"remote {id}") for id in range(PAGE_SIZE)
+    ]
+    PageSerializer.list_concurrency = concurrency
+
+    async def represent():
+        await PageSerializer(instances, many=True).adata
+
+    elapsed = await atimed(represent, REPEAT)
+    print(
+        f"concurrency {concurrency:>3}: {elapsed / 1000:8.1f} ms/page "
+        f"({PAGE_SIZE} instances, {LATENCY * 1000:.0f} ms per remote field)"
+    )
+
+
+if __name__ == "__main__":
+    for concurrency in (1, 10, 50, 100):
+        asyncio.run(run(concurrency))
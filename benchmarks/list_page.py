@@ -0,0 +1,71 @@
+"""
+Measures the cache writes of a list page miss: one `ahas_key` per item
+followed by `aset_many`, against a single unconditional `aset_many`. Cache
+operations are counted as well, since on a networked backend each of them
+is a round trip while `aset_many` is pipelined.
+
+    python -m benchmarks.list_page
+"""
+import asyncio
+
+from .utils import atimed, configure
+
+configure()
+
+from django.core.cache import caches  # noqa: E402
+
+REPEAT = 20
+
+
+class CountingCache:
+    def __init__(self, cache):
+        self._cache = cache
+        self.operations = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._cache, name)
+
+        async def operation(*args, **kwargs):
+            self.operations += 1
+            return await attr(*args, **kwargs)
+
+        return operation
+
+
+async def checked(cache, items):
+    cached_data = {}
+    for key, item in items.items():
+        if not await cache.ahas_key(key):
+            cached_data[key] = item
+    cached_data["model:page"] = list(items)
+    await cache.aset_many(cached_data, 100)
+
+
+async def unconditional(cache, items):
+    await cache.aset_many({**items, "model:page": list(items)}, 100)
+
+
+async def run(alias, page_size):
+    items = {f"model:{id}": {"id": id, "name": f"item {id}"} for id in range(page_size)}
+    results = []
+    for populate in (checked, unconditional):
+        cache = CountingCache(caches[alias])
+
+        async def miss():
+            await caches[alias].aclear()
+            await populate(cache, items)
+
+        elapsed = await atimed(miss, REPEAT)
+        results.append((elapsed, cache.operations // REPEAT))
+    (checked_time, checked_ops), (unconditional_time, unconditional_ops) = results
+    print(
+        f"{alias:>8} {page_size:>5} items: "
+        f"per-item ahas_key {checked_ops:>5} ops {checked_time:10.1f} us, "
+        f"aset_many only {unconditional_ops:>2} ops {unconditional_time:10.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    for alias in ("locmem", "async"):
+        for page_size in (10, 100, 1000):
+            asyncio.run(run(alias, page_size))
@@ -0,0 +1,67 @@
+"""
+Counts the `sync_to_async` thread hops and the wall time of
+`ato_representation` over a page of instances, with one hop per field
+read and per field representation, and with `batch_sync_fields`.
+
+    python -m benchmarks.serializer_hops
+"""
+import asyncio
+from types import SimpleNamespace
+
+from .utils import atimed, configure
+
+configure()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+
+from adrf import serializers as async_serializers  # noqa: E402
+
+FIELDS = 20
+PAGE_SIZE = 100
+REPEAT = 5
+
+hops = 0
+
+
+def counting_sync_to_async(func, **kwargs):
+    async def call(*args, **kw):
+        global hops
+        hops += 1
+        return await sync_to_async(func, **kwargs)(*args, **kw)
+
+    return call
+
+
+PageSerializer = type(
+    "PageSerializer",
+    (async_serializers.AsyncSerializerMixin, serializers.Serializer),
+    {f"field{index}": serializers.CharField() for index in range(FIELDS)},
+)
+
+
+async def represent(serializer, instances):
+    for instance in instances:
+        await serializer.ato_representation(instance)
+
+
+async def run(batch):
+    global hops
+    instances = [
+        SimpleNamespace(**{f"field{index}": f"value {id}" for index in range(FIELDS)})
+        for id in range(PAGE_SIZE)
+    ]
+    serializer = PageSerializer()
+    serializer.batch_sync_fields = batch
+    hops = 0
+    elapsed = await atimed(lambda: represent(serializer, instances), REPEAT)
+    print(
+        f"{'batched' if batch else 'per field':>9}: {hops // REPEAT:>5} thread hops/page, "
+        f"{elapsed / 1000:8.1f} ms/page ({FIELDS} fields, {PAGE_SIZE} instances)"
+    )
+
+
+if __name__ == "__main__":
+    async_serializers.sync_to_async = counting_sync_to_async
+    for batch in (False, True):
+        asyncio.run(run(batch))
@@ -0,0 +1,51 @@
+import django
+from collections import OrderedDict
+from django.conf import settings
+from time import perf_counter
+
+CACHES = {
+    "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "async": {"BACKEND": "adrf.backends.AsyncLocMemCache"},
+}
+
+
+def configure(**options):
+    if not settings.configured:
+        settings.configure(CACHES=CACHES, **options)
+        django.setup()
+
+
+def timed(func, repeat):
+    """
+    Returns the mean wall time of `func()` in microseconds.
+    """
+    started = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - started) / repeat * 1e6
+
+
+async def atimed(func, repeat):
+    """
+    Returns the mean wall time of `await func()` in microseconds.
+    """
+    started = perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (perf_counter() - started) / repeat * 1e6
+
+
+def make_items(count):
+    """
+    Returns `count` nested representations as built by `to_representation`.
+    """
+    return [
+        OrderedDict(
+            id=id,
+            username=f"user {id}",
+            email=f"user{id}@example.com",
+            is_active=True,
+            profile=OrderedDict(bio="Lorem ipsum dolor sit amet. " * 4, tags=["a", "b", "c"]),
+        )
+        for id in range(count)
+    ]
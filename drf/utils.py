@@ -1,49 +1,128 @@
-import inspect
-
-
-# NOTE This function was taken from the python library and modified
-# to allow an exclusion list and avoid recursion errors.
-def getmembers(object, predicate, exclude_names=[]):
-    results = []
-    processed = set()
-    names = [x for x in dir(object) if x not in exclude_names]
-    if inspect.isclass(object):
-        mro = inspect.getmro(object)
-        # add any DynamicClassAttributes to the list of names if object is a class;
-        # this may result in duplicate entries if, for example, a virtual
-        # attribute with the same name as a DynamicClassAttribute exists
-        try:
-            for base in object.__bases__:
-                for k, v in base.__dict__.items():
-                    if (
-                        isinstance(v, inspect.types.DynamicClassAttribute)
-                        and k not in exclude_names
-                    ):
-                        names.append(k)
-        except AttributeError:
-            pass
-    else:
-        mro = ()
-    for key in names:
-        # First try to get the value via getattr.  Some descriptors don't
-        # like calling their __get__ (see bug #1785), so fall back to
-        # looking in the __dict__.
-        try:
-            value = getattr(object, key)
-            # handle the duplicate key
-            if key in processed:
-                raise AttributeError
-        except AttributeError:
-            for base in mro:
-                if key in base.__dict__:
-                    value = base.__dict__[key]
-                    break
-            else:
-                # could be a (currently) missing slot member, or a buggy
-                # __dir__; discard and move on
-                continue
-        if not predicate or predicate(value):
-            results.append((key, value))
-        processed.add(key)
-    results.sort(key=lambda pair: pair[0])
-    return results
+import inspect
+import weakref
+from fnmatch import fnmatchcase
+from operator import itemgetter
+from urllib.parse import urlencode
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import BasePagination
+
+IGNORED_QUERY_PARAMS = ("utm_*", "fbclid", "gclid")
+
+_cache_query_params = weakref.WeakKeyDictionary()
+
+
+# NOTE This function was taken from the python library and modified
+# to allow an exclusion list and avoid recursion errors.
+def getmembers(object, predicate, exclude_names=[]):
+    results = []
+    processed = set()
+    names = [x for x in dir(object) if x not in exclude_names]
+    if inspect.isclass(object):
+        mro = inspect.getmro(object)
+        # add any DynamicClassAttributes to the list of names if object is a class;
+        # this may result in duplicate entries if, for example, a virtual
+        # attribute with the same name as a DynamicClassAttribute exists
+        try:
+            for base in object.__bases__:
+                for k, v in base.__dict__.items():
+                    if (
+                        isinstance(v, inspect.types.DynamicClassAttribute)
+                        and k not in exclude_names
+                    ):
+                        names.append(k)
+        except AttributeError:
+            pass
+    else:
+        mro = ()
+    for key in names:
+        # First try to get the value via getattr.  Some descriptors don't
+        # like calling their __get__ (see bug #1785), so fall back to
+        # looking in the __dict__.
+        try:
+            value = getattr(object, key)
+            # handle the duplicate key
+            if key in processed:
+                raise AttributeError
+        except AttributeError:
+            for base in mro:
+                if key in base.__dict__:
+                    value = base.__dict__[key]
+                    break
+            else:
+                # could be a (currently) missing slot member, or a buggy
+                # __dir__; discard and move on
+                continue
+        if not predicate or predicate(value):
+            results.append((key, value))
+        processed.add(key)
+    results.sort(key=lambda pair: pair[0])
+    return results
+
+
+def get_cache_query_params(view):
+    """
+    Returns the names of the query parameters that can change the list
+    response of a view, or None if any of them can.
+
+    Unless `cache_query_params` is set on the view, these are the parameters
+    declared by its filter backends and paginator through
+    `get_schema_operation_parameters()`. A view overriding `get_queryset()` or
+    `filter_queryset()`, or a component that doesn't declare its parameters,
+    could read any of them, so in that case none is dropped.
+    """
+    query_params = getattr(view, "cache_query_params", None)
+    if query_params is not None:
+        return set(query_params)
+    # `as_view()` initkwargs can give two routes of the same class other
+    # filter backends or another paginator.
+    key = (tuple(getattr(view, "filter_backends", ())), getattr(view, "pagination_class", None))
+    collected = _cache_query_params.setdefault(view.__class__, {})
+    if key not in collected:
+        collected[key] = _collect_query_params(view)
+    return collected[key]
+
+
+def _collect_query_params(view):
+    cls = view.__class__
+    if (
+        getattr(cls, "get_queryset", None) is not GenericAPIView.get_queryset
+        or getattr(cls, "filter_queryset", None) is not GenericAPIView.filter_queryset
+    ):
+        return None
+    components = [backend() for backend in getattr(view, "filter_backends", ())]
+    if getattr(view, "paginator", None) is not None:
+        components.append(view.paginator)
+    query_params = set()
+    for component in components:
+        if type(component).get_schema_operation_parameters in (
+            BaseFilterBackend.get_schema_operation_parameters,
+            BasePagination.get_schema_operation_parameters,
+        ):
+            return None
+        query_params.update(
+            parameter["name"] for parameter in component.get_schema_operation_parameters(view)
+        )
+    return query_params
+
+
+def get_request_cache_path(request, view):
+    """
+    Returns the request path with a canonical query string to build list cache
+    keys from: parameters sorted by name, ignored ones dropped (fnmatch
+    patterns from `cache_ignored_query_params`) and only the parameters
+    consumed by the view kept.
+    """
+    query_params = get_cache_query_params(view)
+    ignored = getattr(view, "cache_ignored_query_params", IGNORED_QUERY_PARAMS)
+    query = sorted(
+        (
+            (key, value)
+            for key, values in request.GET.lists()
+            if (query_params is None or key in query_params)
+            and not any(fnmatchcase(key, pattern) for pattern in ignored)
+            for value in values
+        ),
+        key=itemgetter(0),
+    )
+    return f"{request.path}?{urlencode(query)}" if query else request.path
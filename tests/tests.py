@@ -1,265 +1,1067 @@
-import copy
-from asgiref.sync import async_to_sync
-from django.contrib.auth.models import User
-from django.db import models
-from django.test import TestCase
-
-from rest_framework import status
-from rest_framework import serializers
-from rest_framework.response import Response
-from rest_framework.test import APIRequestFactory
-
-from rest_framework.serializers import ModelSerializer
-from .drf.viewsets import ModelViewSet, ViewSet
-from .drf import generics
-
-
-JSON_ERROR = "JSON parse error - Expecting value:"
-
-
-def sanitise_json_error(error_dict):
-    """
-    Exact contents of JSON error messages depend on the installed version
-    of json.
-    """
-    ret = copy.copy(error_dict)
-    chop = len(JSON_ERROR)
-    ret["detail"] = ret["detail"][:chop]
-    return ret
-
-factory = APIRequestFactory()
-
-
-class BasicViewSet(ViewSet):
-    def list(self, request):
-        return Response({"method": "GET"})
-
-    def create(self, request, *args, **kwargs):
-        return Response({"method": "POST", "data": request.data})
-
-
-class AsyncViewSet(ViewSet):
-    async def list(self, request):
-        return Response({"method": "GET"})
-
-    async def create(self, request, *args, **kwargs):
-        return Response({"method": "POST", "data": request.data})
-
-
-class ViewSetIntegrationTests(TestCase):
-    def setUp(self):
-        self.list = BasicViewSet.as_view({"get": "list"})
-        self.create = BasicViewSet.as_view({"post": "create"})
-
-    def test_get_succeeds(self):
-        request = factory.get("/")
-        response = self.list(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert response.data == {"method": "GET"}
-
-    def test_logged_in_get_succeeds(self):
-        user = User.objects.create_user("user", "user@example.com", "password")
-        request = factory.get("/")
-        # del is used to force the ORM to query the user object again
-        del user.is_active
-        request.user = user
-        response = self.list(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert response.data == {"method": "GET"}
-
-    def test_post_succeeds(self):
-        request = factory.post("/", {"test": "foo"})
-        response = self.create(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert "'test': ['foo']" in str(response.data)
-
-    def test_options_succeeds(self):
-        request = factory.options("/")
-        response = self.list(request)
-        assert response.status_code == status.HTTP_200_OK
-
-
-class AsyncViewSetIntegrationTests(TestCase):
-    def setUp(self):
-        self.list = AsyncViewSet.as_view({"get": "list"})
-        self.create = AsyncViewSet.as_view({"post": "create"})
-
-    def test_get_succeeds(self):
-        request = factory.get("/")
-        response = async_to_sync(self.list)(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert response.data == {"method": "GET"}
-
-    def test_logged_in_get_succeeds(self):
-        user = User.objects.create_user("user", "user@example.com", "password")
-        request = factory.get("/")
-        # del is used to force the ORM to query the user object again
-        del user.is_active
-        request.user = user
-        response = async_to_sync(self.list)(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert response.data == {"method": "GET"}
-
-    def test_post_succeeds(self):
-        request = factory.post("/", {"test": "foo"})
-        response = async_to_sync(self.create)(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert "{'test': ['foo']}" in str(response.data)
-
-    def test_options_succeeds(self):
-        request = factory.options("/")
-        response = async_to_sync(self.list)(request)
-        assert response.status_code == status.HTTP_200_OK
-
-    def test_400_parse_error(self):
-        request = factory.post("/", "f00bar", content_type="application/json")
-        response = async_to_sync(self.create)(request)
-        expected = {"detail": JSON_ERROR}
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert sanitise_json_error(response.data) == expected
-
-
-class UserSerializer(ModelSerializer):
-    class Meta:
-        model = User
-        fields = ("id", "username",)
-
-
-class UserViewSet(ModelViewSet):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class ModelViewSetIntegrationTests(TestCase):
-    def setUp(self):
-        self.list_create = UserViewSet.as_view({"get": "alist", "post": "acreate"})
-        self.retrieve_update = UserViewSet.as_view(
-            {"get": "aretrieve", "put": "aupdate"}
-        )
-        self.destroy = UserViewSet.as_view({"delete": "adestroy"})
-
-    def test_list_succeeds(self):
-        User.objects.create(username="test")
-        request = factory.get("/")
-        response = async_to_sync(self.list_create)(request)
-        assert response.status_code == status.HTTP_200_OK
-        assert "username" in response.data["results"][0].keys()
-        assert "test" in response.data["results"][0].values()
-
-    def test_create_succeeds(self):
-        request = factory.post("/", data={"username": "test"})
-        response = async_to_sync(self.list_create)(request)
-        assert response.status_code == status.HTTP_201_CREATED
-        assert "username" in response.data.keys()
-        assert "test" in response.data.values()
-
-    def test_retrieve_succeeds(self):
-        user = User.objects.create(username="test")
-        request = factory.get("/")
-        response = async_to_sync(self.retrieve_update)(request, pk=user.id)
-        assert response.status_code == status.HTTP_200_OK
-        assert "username" in response.data.keys()
-        assert "test" in response.data.values()
-
-    def test_update_succeeds(self):
-        user = User.objects.create(username="test")
-        request = factory.put("/", data={"username": "not-test"})
-        response = async_to_sync(self.retrieve_update)(request, pk=user.id)
-        assert response.status_code == status.HTTP_200_OK
-        assert "username" in response.data.keys()
-        assert "not-test" in response.data.values()
-
-    def test_destroy_succeeds(self):
-        user = User.objects.create(username="test")
-        request = factory.delete("/")
-        response = async_to_sync(self.destroy)(request, pk=user.id)
-        assert response.status_code == status.HTTP_204_NO_CONTENT
-
-
-class UserSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = User
-        fields = ("id", "username",)
-
-
-class CreateUserView(generics.CreateAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class ListUserView(generics.ListAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class RetrieveUserView(generics.RetrieveAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class DestroyUserView(generics.DestroyAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class UpdateUserView(generics.UpdateAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class TestCreateUserView(TestCase):
-    def setUp(self):
-        self.view = CreateUserView.as_view()
-
-    def test_post_succeeds(self):
-        request = factory.post("/", {"username": "test"})
-        response = async_to_sync(self.view)(request)
-        assert response.status_code == status.HTTP_201_CREATED
-        assert "'username': 'test'" in str(response.data)
-
-
-class TestRetrieveUserView(TestCase):
-    def setUp(self):
-        self.view = RetrieveUserView.as_view()
-
-    def test_get_no_users(self):
-        request = factory.get("/")
-        response = async_to_sync(self.view)(request, pk=1)
-        assert response.status_code == status.HTTP_404_NOT_FOUND
-
-    def test_get_one_user(self):
-        user = User.objects.create(username="test")
-        request = factory.get("/")
-        response = async_to_sync(self.view)(request, pk=user.id)
-        assert response.status_code == status.HTTP_200_OK
-        assert "username" in response.data.keys()
-        assert "test" in response.data.values()
-
-
-class TestDestroyUserView(TestCase):
-    def setUp(self):
-        self.view = DestroyUserView.as_view()
-
-    def test_delete_no_users(self):
-        request = factory.delete("/")
-        response = async_to_sync(self.view)(request, pk=1)
-        assert response.status_code == status.HTTP_404_NOT_FOUND
-
-    def test_delete_one_user(self):
-        user = User.objects.create(username="test")
-        request = factory.delete("/")
-        response = async_to_sync(self.view)(request, pk=user.id)
-        assert response.status_code == status.HTTP_204_NO_CONTENT
-
-
-class TestUpdateUserView(TestCase):
-    def setUp(self):
-        self.view = UpdateUserView.as_view()
-
-    def test_update_user(self):
-        user = User.objects.create(username="test")
-        request = factory.put("/", data={"username": "not-test"})
-        response = async_to_sync(self.view)(request, pk=user.id)
-        assert response.status_code == status.HTTP_200_OK
-        user.refresh_from_db()
-        assert user.username == "not-test"
+import asyncio
+import copy
+import json
+import pickle
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import mock
+from adrf.serializers import ModelSerializer as AsyncModelSerializer
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext, async_to_sync, sync_to_async
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import models
+from django.http import Http404
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework import serializers
+from rest_framework.pagination import LimitOffsetPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from rest_framework.serializers import ModelSerializer
+from .drf.viewsets import ModelViewSet, ViewSet
+from .drf import generics
+from .drf.utils import get_request_cache_path
+from .adrf.cache import (
+    BloomFilter, CompactCodec, LocalCache, PkIndex, SingleFlight, ZlibCodec, pack_entry,
+    revalidate, stale_timeout, unpack_entry,
+)
+from .adrf import mixins as cached_mixins
+from .adrf.loaders import DataLoader
+from .adrf import serializers as async_serializers
+from .adrf.serializers import (
+    AsyncListSerializer, AsyncSerializerMixin, BatchedRelatedField, compile_to_representation,
+)
+from .adrf.mixins import CachedModelViewSet, bump_cache_generation, get_cache_generation
+
+
+JSON_ERROR = "JSON parse error - Expecting value:"
+
+
+def sanitise_json_error(error_dict):
+    """
+    Exact contents of JSON error messages depend on the installed version
+    of json.
+    """
+    ret = copy.copy(error_dict)
+    chop = len(JSON_ERROR)
+    ret["detail"] = ret["detail"][:chop]
+    return ret
+
+factory = APIRequestFactory()
+
+
+class BasicViewSet(ViewSet):
+    def list(self, request):
+        return Response({"method": "GET"})
+
+    def create(self, request, *args, **kwargs):
+        return Response({"method": "POST", "data": request.data})
+
+
+class AsyncViewSet(ViewSet):
+    async def list(self, request):
+        return Response({"method": "GET"})
+
+    async def create(self, request, *args, **kwargs):
+        return Response({"method": "POST", "data": request.data})
+
+
+class ViewSetIntegrationTests(TestCase):
+    def setUp(self):
+        self.list = BasicViewSet.as_view({"get": "list"})
+        self.create = BasicViewSet.as_view({"post": "create"})
+
+    def test_get_succeeds(self):
+        request = factory.get("/")
+        response = self.list(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"method": "GET"}
+
+    def test_logged_in_get_succeeds(self):
+        user = User.objects.create_user("user", "user@example.com", "password")
+        request = factory.get("/")
+        # del is used to force the ORM to query the user object again
+        del user.is_active
+        request.user = user
+        response = self.list(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"method": "GET"}
+
+    def test_post_succeeds(self):
+        request = factory.post("/", {"test": "foo"})
+        response = self.create(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert "'test': ['foo']" in str(response.data)
+
+    def test_options_succeeds(self):
+        request = factory.options("/")
+        response = self.list(request)
+        assert response.status_code == status.HTTP_200_OK
+
+
+class AsyncViewSetIntegrationTests(TestCase):
+    def setUp(self):
+        self.list = AsyncViewSet.as_view({"get": "list"})
+        self.create = AsyncViewSet.as_view({"post": "create"})
+
+    def test_get_succeeds(self):
+        request = factory.get("/")
+        response = async_to_sync(self.list)(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"method": "GET"}
+
+    def test_logged_in_get_succeeds(self):
+        user = User.objects.create_user("user", "user@example.com", "password")
+        request = factory.get("/")
+        # del is used to force the ORM to query the user object again
+        del user.is_active
+        request.user = user
+        response = async_to_sync(self.list)(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"method": "GET"}
+
+    def test_post_succeeds(self):
+        request = factory.post("/", {"test": "foo"})
+        response = async_to_sync(self.create)(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert "{'test': ['foo']}" in str(response.data)
+
+    def test_options_succeeds(self):
+        request = factory.options("/")
+        response = async_to_sync(self.list)(request)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_400_parse_error(self):
+        request = factory.post("/", "f00bar", content_type="application/json")
+        response = async_to_sync(self.create)(request)
+        expected = {"detail": JSON_ERROR}
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert sanitise_json_error(response.data) == expected
+
+
+class UserSerializer(ModelSerializer):
+    class Meta:
+        model = User
+        fields = ("id", "username",)
+
+
+class UserViewSet(ModelViewSet):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class ModelViewSetIntegrationTests(TestCase):
+    def setUp(self):
+        self.list_create = UserViewSet.as_view({"get": "alist", "post": "acreate"})
+        self.retrieve_update = UserViewSet.as_view(
+            {"get": "aretrieve", "put": "aupdate"}
+        )
+        self.destroy = UserViewSet.as_view({"delete": "adestroy"})
+
+    def test_list_succeeds(self):
+        User.objects.create(username="test")
+        request = factory.get("/")
+        response = async_to_sync(self.list_create)(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert "username" in response.data["results"][0].keys()
+        assert "test" in response.data["results"][0].values()
+
+    def test_create_succeeds(self):
+        request = factory.post("/", data={"username": "test"})
+        response = async_to_sync(self.list_create)(request)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "username" in response.data.keys()
+        assert "test" in response.data.values()
+
+    def test_retrieve_succeeds(self):
+        user = User.objects.create(username="test")
+        request = factory.get("/")
+        response = async_to_sync(self.retrieve_update)(request, pk=user.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert "username" in response.data.keys()
+        assert "test" in response.data.values()
+
+    def test_update_succeeds(self):
+        user = User.objects.create(username="test")
+        request = factory.put("/", data={"username": "not-test"})
+        response = async_to_sync(self.retrieve_update)(request, pk=user.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert "username" in response.data.keys()
+        assert "not-test" in response.data.values()
+
+    def test_destroy_succeeds(self):
+        user = User.objects.create(username="test")
+        request = factory.delete("/")
+        response = async_to_sync(self.destroy)(request, pk=user.id)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+class UserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ("id", "username",)
+
+
+class CreateUserView(generics.CreateAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class ListUserView(generics.ListAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class RetrieveUserView(generics.RetrieveAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class DestroyUserView(generics.DestroyAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class UpdateUserView(generics.UpdateAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+
+
+class TestCreateUserView(TestCase):
+    def setUp(self):
+        self.view = CreateUserView.as_view()
+
+    def test_post_succeeds(self):
+        request = factory.post("/", {"username": "test"})
+        response = async_to_sync(self.view)(request)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "'username': 'test'" in str(response.data)
+
+
+class TestRetrieveUserView(TestCase):
+    def setUp(self):
+        self.view = RetrieveUserView.as_view()
+
+    def test_get_no_users(self):
+        request = factory.get("/")
+        response = async_to_sync(self.view)(request, pk=1)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_get_one_user(self):
+        user = User.objects.create(username="test")
+        request = factory.get("/")
+        response = async_to_sync(self.view)(request, pk=user.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert "username" in response.data.keys()
+        assert "test" in response.data.values()
+
+
+class TestDestroyUserView(TestCase):
+    def setUp(self):
+        self.view = DestroyUserView.as_view()
+
+    def test_delete_no_users(self):
+        request = factory.delete("/")
+        response = async_to_sync(self.view)(request, pk=1)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_delete_one_user(self):
+        user = User.objects.create(username="test")
+        request = factory.delete("/")
+        response = async_to_sync(self.view)(request, pk=user.id)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+class TestUpdateUserView(TestCase):
+    def setUp(self):
+        self.view = UpdateUserView.as_view()
+
+    def test_update_user(self):
+        user = User.objects.create(username="test")
+        request = factory.put("/", data={"username": "not-test"})
+        response = async_to_sync(self.view)(request, pk=user.id)
+        assert response.status_code == status.HTTP_200_OK
+        user.refresh_from_db()
+        assert user.username == "not-test"
+
+
+class CacheGenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generation_is_stable_until_bumped(self):
+        generation = async_to_sync(get_cache_generation)("model")
+        assert async_to_sync(get_cache_generation)("model") == generation
+        async_to_sync(bump_cache_generation)("model")
+        assert async_to_sync(get_cache_generation)("model") != generation
+
+    def test_bump_restarts_evicted_generation(self):
+        async_to_sync(bump_cache_generation)("model")
+        assert async_to_sync(get_cache_generation)("model") is not None
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        async def build():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def run():
+            single_flight = SingleFlight()
+            return await asyncio.gather(*(single_flight.run("key", build) for _ in range(5)))
+
+        assert async_to_sync(run)() == [1] * 5
+        assert len(calls) == 1
+
+    def test_build_runs_outside_of_the_caller_context(self):
+        contexts = []
+
+        async def build():
+            await asyncio.sleep(0.01)
+            contexts.append(SyncToAsync.thread_sensitive_context.get(None))
+
+        async def run():
+            single_flight = SingleFlight()
+            async with ThreadSensitiveContext():
+                caller = asyncio.ensure_future(single_flight.run("key", build))
+                await asyncio.sleep(0)
+                caller.cancel()
+            await asyncio.sleep(0.05)
+
+        async_to_sync(run)()
+        assert contexts == [None]
+
+
+class RevalidateTests(TestCase):
+    def test_rebuild_runs_outside_of_the_request_context(self):
+        contexts = []
+
+        async def build():
+            contexts.append(SyncToAsync.thread_sensitive_context.get(None))
+            raise Http404
+
+        async def run():
+            async with ThreadSensitiveContext():
+                revalidate("key", build)
+            await asyncio.sleep(0.05)
+
+        with self.assertNoLogs(level="WARNING"):
+            async_to_sync(run)()
+        assert contexts == [None]
+
+
+class CacheEntryTests(TestCase):
+    def test_entries_are_packed_only_with_stale_ttl(self):
+        assert pack_entry("value", 10, None) == "value"
+        assert unpack_entry(pack_entry("value", 10, None)) == ("value", False)
+        assert stale_timeout(10, 5) == 15
+
+    def test_entry_turns_stale_after_soft_expiry(self):
+        assert unpack_entry(pack_entry("value", 10, 5)) == ("value", False)
+        assert unpack_entry(pack_entry("value", -1, 5)) == ("value", True)
+
+
+class LocalCacheTests(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        local = LocalCache(max_entries=2)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+        local.set("c", 3)
+        assert local.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+    def test_byte_budget_is_enforced(self):
+        local = LocalCache(max_bytes=100)
+        local.set("a", "x" * 60)
+        local.set("b", "x" * 60)
+        assert not local.has_key("a")
+        assert local.has_key("b")
+        local.set("c", "x" * 200)
+        assert not local.has_key("c")
+
+    def test_entries_expire(self):
+        local = LocalCache(timeout=5)
+        local.set("a", 1, 0)
+        local.set("b", 2, -1)
+        assert local.get("a") is None
+        assert local.get("b") is None
+
+
+class ZlibCodecTests(TestCase):
+    def test_values_reaching_threshold_are_compressed(self):
+        codec = ZlibCodec(threshold=100)
+        small, large = {"id": 1}, {"items": ["x" * 10] * 100}
+        assert not codec.encode(small).startswith(ZlibCodec.HEADER)
+        assert codec.decode(codec.encode(small)) == small
+        encoded = codec.encode(large)
+        assert encoded.startswith(ZlibCodec.HEADER)
+        assert codec.decode(encoded) == large
+
+
+class CompactCodecTests(TestCase):
+    def test_representations_are_stored_as_plain_trees(self):
+        codec = CompactCodec()
+        value = [OrderedDict(id=1, tags=["a"], owner=OrderedDict(id=2, name="x"))]
+        decoded = codec.decode(codec.encode(value))
+        assert decoded == value
+        assert type(decoded[0]) is dict
+        assert list(decoded[0]) == ["id", "tags", "owner"]
+
+    def test_lists_of_dicts_are_stored_by_column(self):
+        codec = CompactCodec()
+        value = {"count": 20, "results": [
+            OrderedDict(id=id, name=f"user {id}", owner=OrderedDict(id=id, tags=["a"]))
+            for id in range(20)
+        ]}
+        encoded = codec.encode(value)
+        assert codec.decode(encoded) == value
+        assert list(codec.decode(encoded)["results"][0]) == ["id", "name", "owner"]
+        assert len(encoded) < len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def test_undecodable_values_decode_to_none(self):
+        assert CompactCodec().decode(CompactCodec.HEADER + b"\xff") is None
+        assert ZlibCodec().decode(ZlibCodec.HEADER + b"\xff") is None
+
+    def test_unsupported_values_are_stored_untouched(self):
+        codec = CompactCodec()
+        value = {"price": Decimal("1.50")}
+        assert codec.encode(value) is value
+        assert codec.decode(value) is value
+
+
+class CountingCache:
+    def __init__(self, cache):
+        self._cache = cache
+        self.operations = []
+
+    def __getattr__(self, name):
+        attr = getattr(self._cache, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def operation(*args, **kwargs):
+            self.operations.append(name)
+            return await attr(*args, **kwargs)
+
+        return operation
+
+
+class AsyncUserSerializer(AsyncModelSerializer):
+    class Meta:
+        model = User
+        fields = ("id", "username",)
+
+
+class UserPagination(PageNumberPagination):
+    page_size = 10
+
+
+class CachedUserViewSet(CachedModelViewSet):
+    queryset = User.objects.all().order_by("id")
+    serializer_class = AsyncUserSerializer
+    pagination_class = UserPagination
+
+
+class BloomFilterTests(TestCase):
+    def test_added_keys_are_members(self):
+        bloom = BloomFilter(1000, 0.01)
+        for key in range(1000):
+            bloom.add(key)
+        assert all(key in bloom for key in range(1000))
+        false_positives = sum(key in bloom for key in range(1000, 11000))
+        assert false_positives < 300
+
+
+class UpperCaseField(serializers.CharField):
+    async def ato_representation(self, value):
+        return value.upper()
+
+
+class BatchedSerializer(AsyncSerializerMixin, serializers.Serializer):
+    first = serializers.CharField()
+    second = UpperCaseField()
+    third = serializers.IntegerField()
+    missing = serializers.CharField(allow_null=True)
+
+
+class BatchSyncFieldsTests(TestCase):
+    def test_batched_representation_matches_per_field_one(self):
+        instance = type("Instance", (), {"first": "a", "second": "b", "third": 3, "missing": None})
+        serializer = BatchedSerializer()
+        expected = async_to_sync(serializer.ato_representation)(instance)
+        serializer.batch_sync_fields = True
+        with mock.patch.object(
+            async_serializers, "sync_to_async", wraps=sync_to_async
+        ) as hops:
+            ret = async_to_sync(serializer.ato_representation)(instance)
+        assert ret == expected == {"first": "a", "second": "B", "third": 3, "missing": None}
+        assert list(ret) == ["first", "second", "third", "missing"]
+        assert hops.call_count == 1
+
+
+class PlannedSerializer(AsyncSerializerMixin, serializers.Serializer):
+    name = serializers.CharField()
+    owner_name = serializers.CharField(source="owner.name")
+    label = serializers.CharField(source="get_label")
+    nickname = serializers.CharField(required=False)
+
+
+class FieldPlanTests(TestCase):
+    def test_plan_is_built_once_per_serializer(self):
+        serializer = PlannedSerializer()
+        plan = serializer.get_field_plan()
+        assert serializer.get_field_plan() is plan
+        assert [step.name for step in plan] == ["name", "owner_name", "label", "nickname"]
+        assert [step.is_async for step in plan] == [False] * 4
+
+    def test_plan_reads_objects_mappings_and_callables(self):
+        owner = type("Owner", (), {"name": "owner"})
+        instance = type("Instance", (), {
+            "name": "a", "owner": owner, "get_label": lambda self: "label",
+        })()
+        mapping = {"name": "a", "owner": {"name": "owner"}, "get_label": "label"}
+        serializer = PlannedSerializer()
+        for batch in (False, True):
+            serializer.batch_sync_fields = batch
+            for value in (instance, mapping):
+                ret = async_to_sync(serializer.ato_representation)(value)
+                assert ret == {"name": "a", "owner_name": "owner", "label": "label"}
+
+
+class CompiledUserSerializer(AsyncSerializerMixin, ModelSerializer):
+    compile_representation = True
+
+    class Meta:
+        model = User
+        fields = ("id", "username", "is_staff", "date_joined", "last_login")
+
+
+class CompiledRepresentationTests(TestCase):
+    def test_compiled_representation_matches_generic_one(self):
+        user = User.objects.create(username="test")
+        serializer = CompiledUserSerializer()
+        assert serializer.get_compiled_representation() is not None
+        ret = async_to_sync(serializer.ato_representation)(user)
+        assert ret == ModelSerializer.to_representation(serializer, user)
+        assert ret["last_login"] is None
+
+    def test_serializers_with_relations_are_not_compiled(self):
+        serializer = type("GroupsSerializer", (CompiledUserSerializer,), {
+            "Meta": type("Meta", (), {"model": User, "fields": ("id", "groups")}),
+        })()
+        assert compile_to_representation(serializer) is None
+
+
+class DelayedField(serializers.IntegerField):
+    running = peak = 0
+
+    async def ato_representation(self, value):
+        DelayedField.running += 1
+        DelayedField.peak = max(DelayedField.peak, DelayedField.running)
+        # Later instances finish first.
+        await asyncio.sleep((10 - value) / 1000)
+        DelayedField.running -= 1
+        return value
+
+
+class DelayedSerializer(AsyncSerializerMixin, serializers.Serializer):
+    list_concurrency = 3
+    value = DelayedField()
+
+    class Meta:
+        list_serializer_class = AsyncListSerializer
+
+
+class AsyncListSerializerTests(TestCase):
+    def test_instances_are_represented_concurrently_in_order(self):
+        DelayedField.running = DelayedField.peak = 0
+        instances = [{"value": value} for value in range(10)]
+        serializer = DelayedSerializer(instances, many=True)
+        assert isinstance(serializer, AsyncListSerializer)
+
+        async def adata():
+            return await serializer.adata
+
+        data = async_to_sync(adata)()
+        assert [item["value"] for item in data] == list(range(10))
+        assert DelayedField.peak == 3
+
+
+class ContentTypeSerializer(AsyncSerializerMixin, ModelSerializer):
+    class Meta:
+        model = ContentType
+        fields = ("id", "model")
+
+
+class PermissionSerializer(AsyncSerializerMixin, ModelSerializer):
+    content_type = BatchedRelatedField(serializer=ContentTypeSerializer)
+
+    class Meta:
+        model = Permission
+        fields = ("id", "codename", "content_type")
+        list_serializer_class = AsyncListSerializer
+
+
+class BatchedRelatedFieldTests(TestCase):
+    def test_related_objects_are_loaded_in_one_query(self):
+        content_types = [
+            ContentType.objects.create(app_label="tests", model=f"model{index}")
+            for index in range(3)
+        ]
+        permissions = [
+            Permission.objects.create(
+                name=f"permission {index}",
+                codename=f"permission_{index}",
+                content_type=content_types[index % 3],
+            )
+            for index in range(9)
+        ]
+        serializer = PermissionSerializer(permissions, many=True)
+
+        async def adata():
+            return await serializer.adata
+
+        with self.assertNumQueries(1):
+            data = async_to_sync(adata)()
+        assert [item["content_type"] for item in data] == [
+            {"id": content_types[index % 3].pk, "model": f"model{index % 3}"}
+            for index in range(9)
+        ]
+
+    def test_missing_related_objects_are_represented_as_none(self):
+        content_type = ContentType(pk=0)
+        field = PermissionSerializer().fields["content_type"]
+        value = field.get_attribute(Permission(content_type=content_type))
+        assert field.to_representation(value) is None
+        assert async_to_sync(field.ato_representation)(value) is None
+
+
+class DataLoaderTests(TestCase):
+    def test_cancelled_batch_releases_its_callers(self):
+        async def batch_load(keys):
+            raise asyncio.CancelledError
+
+        async def load():
+            loader = DataLoader(batch_load)
+            return await asyncio.wait_for(asyncio.gather(
+                loader.load(1), loader.load(2), return_exceptions=True,
+            ), 1)
+
+        results = async_to_sync(load)()
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+def cached_item(key):
+    return CompactCodec().decode(cache.get(key))
+
+
+class CachedModelViewSetCacheOperationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.list = CachedUserViewSet.as_view({"get": "alist"})
+        self.retrieve = CachedUserViewSet.as_view({"get": "aretrieve"})
+
+    def test_retrieve_hit_is_one_cache_operation(self):
+        user = User.objects.create(username="test")
+        async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            response = async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["username"] == "test"
+        # the item and its ETag
+        assert counting_cache.operations == ["aget_many"]
+
+    def test_retrieve_matching_etag_is_not_modified(self):
+        user = User.objects.create(username="test")
+        etag = async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)["ETag"]
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            response = async_to_sync(self.retrieve)(
+                factory.get("/", HTTP_IF_NONE_MATCH=etag), pk=user.id
+            )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        assert counting_cache.operations == ["aget"]
+        async_to_sync(CachedUserViewSet.as_view({"put": "aupdate"}))(
+            factory.put("/", {"username": "updated"}, format="json"), pk=user.id
+        )
+        response = async_to_sync(self.retrieve)(
+            factory.get("/", HTTP_IF_NONE_MATCH=etag), pk=user.id
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["username"] == "updated"
+        assert response["ETag"] != etag
+
+    def test_if_match_mismatch_is_rejected_before_fetching(self):
+        user = User.objects.create(username="test")
+        async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)
+        update = CachedUserViewSet.as_view({"put": "aupdate", "delete": "adestroy"})
+        for request in (
+            factory.put("/", {"username": "x"}, format="json", HTTP_IF_MATCH='W/"stale"'),
+            factory.delete("/", HTTP_IF_MATCH='W/"stale"'),
+        ):
+            with self.assertNumQueries(0):
+                response = async_to_sync(update)(request, pk=user.id)
+            assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert User.objects.get(id=user.id).username == "test"
+
+    def test_if_match_on_current_etag_updates(self):
+        user = User.objects.create(username="test")
+        etag = async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)["ETag"]
+        response = async_to_sync(CachedUserViewSet.as_view({"put": "aupdate"}))(
+            factory.put("/", {"username": "updated"}, format="json", HTTP_IF_MATCH=etag),
+            pk=user.id,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert User.objects.get(id=user.id).username == "updated"
+
+    def test_unchanged_put_skips_the_update(self):
+        user = User.objects.create(username="test")
+        for cache_local in (None, LocalCache()):
+            cache.clear()
+            view = type("LocalUserViewSet", (CachedUserViewSet,), {"cache_local": cache_local})
+            async_to_sync(view.as_view({"get": "aretrieve"}))(factory.get("/"), pk=user.id)
+            update = view.as_view({"put": "aupdate"})
+            # only the object lookup, no UPDATE
+            with self.assertNumQueries(1):
+                response = async_to_sync(update)(
+                    factory.put("/", {"id": user.id, "username": "test"}, format="json"),
+                    pk=user.id,
+                )
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data["username"] == "test"
+
+    def test_list_hit_drops_items_cached_as_not_found(self):
+        first = User.objects.create(username="first")
+        User.objects.create(username="second")
+        for cache_rendered in (False, True):
+            cache.clear()
+            view = type("NegativeUserViewSet", (CachedUserViewSet,), {
+                "cache_not_found_ttl": 10, "cache_rendered": cache_rendered,
+            })
+            async_to_sync(view.as_view({"get": "alist"}))(factory.get("/"))
+            User.objects.filter(id=first.id).delete()
+            cache_key = async_to_sync(cached_mixins.generate_cache_key)(view())
+            cache.delete(f"{cache_key}:{first.id}")
+            response = async_to_sync(view.as_view({"get": "aretrieve"}))(
+                factory.get("/"), pk=first.id
+            )
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+            response = async_to_sync(view.as_view({"get": "alist"}))(factory.get("/"))
+            if not cache_rendered:
+                response.render()
+            usernames = [item["username"] for item in json.loads(response.content)["results"]]
+            assert usernames == ["second"]
+            first = User.objects.create(username="first")
+
+    def test_preconditions_ignore_a_lagging_local_tier(self):
+        user = User.objects.create(username="test")
+        # two processes, each with its own local tier
+        first, second = (
+            type("LocalUserViewSet", (CachedUserViewSet,), {"cache_local": LocalCache()})
+            for _ in range(2)
+        )
+        etag = async_to_sync(first.as_view({"get": "aretrieve"}))(
+            factory.get("/"), pk=user.id
+        )["ETag"]
+        async_to_sync(second.as_view({"put": "aupdate"}))(
+            factory.put("/", {"id": user.id, "username": "new"}, format="json"), pk=user.id
+        )
+        response = async_to_sync(first.as_view({"delete": "adestroy"}))(
+            factory.delete("/", HTTP_IF_MATCH=etag), pk=user.id
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        async_to_sync(first.as_view({"put": "aupdate"}))(
+            factory.put("/", {"id": user.id, "username": "test"}, format="json"), pk=user.id
+        )
+        assert User.objects.get(id=user.id).username == "test"
+
+    def test_not_found_is_cached_until_created(self):
+        view = type("NegativeUserViewSet", (CachedUserViewSet,), {"cache_not_found_ttl": 10})
+        retrieve = view.as_view({"get": "aretrieve"})
+        probe = User.objects.create(username="probe")
+        pk = probe.id + 1
+        probe.delete()
+        assert async_to_sync(retrieve)(factory.get("/"), pk=pk).status_code == 404
+        with self.assertNumQueries(0):
+            response = async_to_sync(retrieve)(factory.get("/"), pk=pk)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = async_to_sync(view.as_view({"post": "acreate"}))(
+            factory.post("/", {"username": "created"}, format="json")
+        )
+        assert response.data["id"] == pk
+        response = async_to_sync(retrieve)(factory.get("/"), pk=pk)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["username"] == "created"
+
+    def test_pk_index_rejects_missing_pks_without_cache_reads(self):
+        users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        users[1].delete()
+        index = PkIndex(capacity=100)
+        async_to_sync(index.abuild)(User.objects.all())
+        view = type("IndexedUserViewSet", (CachedUserViewSet,), {"cache_pk_index": index})
+        retrieve = view.as_view({"get": "aretrieve"})
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            with self.assertNumQueries(0):
+                for pk in (users[1].id, "abc"):
+                    response = async_to_sync(retrieve)(factory.get("/"), pk=pk)
+                    assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert counting_cache.operations == []
+        response = async_to_sync(view.as_view({"post": "acreate"}))(
+            factory.post("/", {"username": "created"}, format="json")
+        )
+        for pk in (users[0].id, response.data["id"]):
+            assert async_to_sync(retrieve)(factory.get("/"), pk=pk).status_code == 200
+
+    def test_pk_index_retries_a_failed_build_after_the_interval(self):
+        queryset = mock.Mock()
+        queryset.acount = mock.AsyncMock(side_effect=RuntimeError)
+        index = PkIndex(capacity=100)
+
+        async def retrieve_many():
+            for pk in range(3):
+                assert index.might_exist(pk, queryset)
+                await asyncio.sleep(0.01)
+
+        with self.assertLogs(level="WARNING"):
+            async_to_sync(retrieve_many)()
+        assert queryset.acount.call_count == 1
+
+    def test_list_matching_etag_is_not_modified(self):
+        User.objects.create(username="test")
+        etag = async_to_sync(self.list)(factory.get("/"))["ETag"]
+        response = async_to_sync(self.list)(factory.get("/", HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        User.objects.create(username="other")
+        async_to_sync(bump_cache_generation)(
+            async_to_sync(cached_mixins.generate_cache_key)(CachedUserViewSet())
+        )
+        response = async_to_sync(self.list)(factory.get("/", HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_hit_reads_the_page_once(self):
+        User.objects.create(username="test")
+        async_to_sync(self.list)(factory.get("/"))
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            response = async_to_sync(self.list)(factory.get("/"))
+        assert response.status_code == status.HTTP_200_OK
+        # generation counter, page entry and one batch of items
+        assert counting_cache.operations == ["aget", "aget", "aget_many"]
+
+    def test_list_hit_refetches_evicted_items(self):
+        first = User.objects.create(username="first")
+        User.objects.create(username="second")
+        async_to_sync(self.list)(factory.get("/"))
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(CachedUserViewSet())
+        cache.delete(f"{cache_key}:{first.id}")
+        response = async_to_sync(self.list)(factory.get("/"))
+        usernames = [item["username"] for item in response.data["results"]]
+        assert usernames == ["first", "second"]
+        assert cached_item(f"{cache_key}:{first.id}")["username"] == "first"
+
+    def test_page_links_are_built_from_the_current_request(self):
+        for username in ("first", "second", "third"):
+            User.objects.create(username=username)
+        pagination = type("PairPagination", (PageNumberPagination,), {"page_size": 1})
+        for cache_rendered in (False, True):
+            cache.clear()
+            view = type("PairUserViewSet", (CachedUserViewSet,), {
+                "pagination_class": pagination, "cache_rendered": cache_rendered,
+            })
+            list = view.as_view({"get": "alist"})
+            async_to_sync(list)(factory.get("/users/?fbclid=secret&utm_source=mail&page=2"))
+            with self.settings(ALLOWED_HOSTS=["other.example"]), self.assertNumQueries(0):
+                response = async_to_sync(list)(
+                    factory.get("/users/?page=2", HTTP_HOST="other.example")
+                )
+            if not cache_rendered:
+                response.render()
+            data = json.loads(response.content)
+            assert data["next"] == "http://other.example/users/?page=3"
+            assert data["previous"] == "http://other.example/users/"
+
+    def test_list_hit_refetches_evicted_items_by_custom_id(self):
+        User.objects.create(username="first")
+        User.objects.create(username="second")
+        serializer = type("UsernameSerializer", (AsyncUserSerializer,), {"custom_id": "username"})
+        view = type("UsernameUserViewSet", (CachedUserViewSet,), {"serializer_class": serializer})
+        async_to_sync(view.as_view({"get": "alist"}))(factory.get("/"))
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(view())
+        cache.delete(f"{cache_key}:first")
+        response = async_to_sync(view.as_view({"get": "alist"}))(factory.get("/"))
+        usernames = [item["username"] for item in response.data["results"]]
+        assert usernames == ["first", "second"]
+
+    def test_key_prefix_namespaces_cache_keys(self):
+        user = User.objects.create(username="test")
+        view = type("PrefixedUserViewSet", (CachedUserViewSet,), {"cache_key_prefix": "v2"})
+        async_to_sync(view.as_view({"get": "aretrieve"}))(factory.get("/"), pk=user.id)
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(view())
+        assert cache_key.startswith("v2:")
+        assert cached_item(f"{cache_key}:{user.id}")["username"] == "test"
+
+    def test_cache_namespace_is_computed_once_per_view(self):
+        view = type("NamespacedUserViewSet", (CachedUserViewSet,), {})()
+        with mock.patch.object(
+            view, "get_serializer_class", return_value=AsyncUserSerializer
+        ) as get_serializer_class:
+            first = async_to_sync(cached_mixins.generate_cache_key)(view)
+            second = async_to_sync(cached_mixins.generate_cache_key)(view)
+        assert first == second
+        assert get_serializer_class.call_count == 1
+
+    def test_routes_with_other_initkwargs_have_their_own_namespace(self):
+        user = User.objects.create(username="user")
+        group = Group.objects.create(name="group")
+        group_serializer = type("AsyncGroupSerializer", (AsyncModelSerializer,), {
+            "Meta": type("Meta", (), {"model": Group, "fields": ("id", "name")}),
+        })
+        users = CachedUserViewSet.as_view({"get": "aretrieve"})
+        groups = CachedUserViewSet.as_view(
+            {"get": "aretrieve"}, queryset=Group.objects.all(), serializer_class=group_serializer
+        )
+        assert async_to_sync(users)(factory.get("/"), pk=user.id).data == {
+            "id": user.id, "username": "user",
+        }
+        assert async_to_sync(groups)(factory.get("/"), pk=group.id).data == {
+            "id": group.id, "name": "group",
+        }
+
+    def test_rendered_retrieve_hit_skips_serialization(self):
+        user = User.objects.create(username="test")
+        view = type("RenderedUserViewSet", (CachedUserViewSet,), {"cache_rendered": True})
+        retrieve = view.as_view({"get": "aretrieve"})
+        first = async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        with mock.patch.object(view, "get_serializer") as get_serializer:
+            second = async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        assert not get_serializer.called
+        assert second.content == first.content == b'{"id":%d,"username":"test"}' % user.id
+        assert second["ETag"] == first["ETag"]
+        async_to_sync(view.as_view({"put": "aupdate"}))(
+            factory.put("/", {"username": "updated"}, format="json"), pk=user.id
+        )
+        third = async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        assert b"updated" in third.content
+        assert third["ETag"] != first["ETag"]
+
+    def test_rendered_list_hit_is_spliced_from_rendered_items(self):
+        for username in ("first", "second"):
+            User.objects.create(username=username)
+        view = type("RenderedUserViewSet", (CachedUserViewSet,), {"cache_rendered": True})
+        list_view = view.as_view({"get": "alist"})
+        expected = async_to_sync(self.list)(factory.get("/")).render().content
+        async_to_sync(list_view)(factory.get("/"))
+        async_to_sync(list_view)(factory.get("/"))
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            response = async_to_sync(list_view)(factory.get("/"))
+        assert response.content == expected
+        # generation counter, page entry and one batch of rendered items
+        assert counting_cache.operations == ["aget", "aget", "aget_many"]
+
+    def test_rendered_items_survive_a_page_rebuild(self):
+        for username in ("first", "second", "third"):
+            User.objects.create(username=username)
+        view = type("RenderedUserViewSet", (CachedUserViewSet,), {"cache_rendered": True})
+        list_view = view.as_view({"get": "alist"})
+        async_to_sync(list_view)(factory.get("/"))
+        async_to_sync(list_view)(factory.get("/"))
+        async_to_sync(view.as_view({"post": "acreate"}))(
+            factory.post("/", {"username": "created"}, format="json")
+        )
+        async_to_sync(list_view)(factory.get("/"))
+        with mock.patch.object(
+            cached_mixins, "render_content", wraps=cached_mixins.render_content
+        ) as render_content:
+            async_to_sync(list_view)(factory.get("/"))
+        # the created item and the envelope
+        assert render_content.call_count == 2
+
+    def test_codec_compresses_stored_entries(self):
+        user = User.objects.create(username="test")
+        view = type("CompressedUserViewSet", (CachedUserViewSet,), {
+            "cache_codec": ZlibCodec(threshold=0),
+        })
+        retrieve = view.as_view({"get": "aretrieve"})
+        async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(view())
+        assert cache.get(f"{cache_key}:{user.id}").startswith(ZlibCodec.HEADER)
+        response = async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        assert response.data["username"] == "test"
+
+    def test_undecodable_entries_are_rebuilt(self):
+        user = User.objects.create(username="test")
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(CachedUserViewSet())
+        cache.set(f"{cache_key}:{user.id}", CompactCodec.HEADER + b"\xff")
+        with self.assertNumQueries(1):
+            response = async_to_sync(self.retrieve)(factory.get("/"), pk=user.id)
+        assert response.data["username"] == "test"
+        assert cached_item(f"{cache_key}:{user.id}")["username"] == "test"
+
+    def test_oversized_entries_are_chunked(self):
+        for username in ("first", "second"):
+            User.objects.create(username=username * 20)
+        view = type("ChunkedUserViewSet", (CachedUserViewSet,), {"cache_max_value_size": 16})
+        list_view = view.as_view({"get": "alist"})
+        expected = async_to_sync(list_view)(factory.get("/")).data
+        counting_cache = CountingCache(cache)
+        with mock.patch.object(cached_mixins, "get_cache", lambda view: counting_cache):
+            response = async_to_sync(list_view)(factory.get("/"))
+        assert response.data == expected
+        # generation counter, page entry and its chunks, items and their chunks
+        assert counting_cache.operations == ["aget", "aget", "aget_many", "aget_many", "aget_many"]
+
+    def test_entry_with_evicted_chunk_is_a_miss(self):
+        user = User.objects.create(username="test" * 20)
+        view = type("ChunkedUserViewSet", (CachedUserViewSet,), {"cache_max_value_size": 16})
+        retrieve = view.as_view({"get": "aretrieve"})
+        async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        cache_key = async_to_sync(cached_mixins.generate_cache_key)(view())
+        manifest = cache.get(f"{cache_key}:{user.id}")
+        cache.delete(f"{cache_key}:{user.id}:chunk:{manifest.token}:1")
+        with self.assertNumQueries(1):
+            response = async_to_sync(retrieve)(factory.get("/"), pk=user.id)
+        assert response.data["username"] == "test" * 20
+
+
+class RequestCachePathTests(TestCase):
+    def test_query_string_is_canonical(self):
+        view = type("PagedUserViewSet", (CachedUserViewSet,), {
+            "filter_backends": (),
+            "pagination_class": PageNumberPagination,
+        })()
+        first = factory.get("/users/", {"page": "2", "utm_source": "mail", "unused": "1"})
+        second = factory.get("/users/?utm_medium=x&page=2")
+        assert get_request_cache_path(first, view) == "/users/?page=2"
+        assert get_request_cache_path(second, view) == "/users/?page=2"
+
+    def test_routes_with_another_paginator_keep_their_parameters(self):
+        request = factory.get("/users/", {"page": "2", "limit": "5"})
+        for pagination_class, path in (
+            (PageNumberPagination, "/users/?page=2"),
+            (LimitOffsetPagination, "/users/?limit=5"),
+        ):
+            view = CachedUserViewSet(filter_backends=(), pagination_class=pagination_class)
+            assert get_request_cache_path(request, view) == path
+
+    def test_parameters_are_sorted_by_name(self):
+        view = type("QueryUserViewSet", (CachedUserViewSet,), {"cache_query_params": ("b", "a")})
+        request = factory.get("/users/?b=2&a=1&b=1")
+        assert get_request_cache_path(request, view()) == "/users/?a=1&b=2&b=1"
+
+    def test_overridden_get_queryset_keeps_every_parameter(self):
+        view = type("ScopedUserViewSet", (CachedUserViewSet,), {
+            "get_queryset": lambda self: User.objects.all(),
+        })
+        request = factory.get("/users/?owner=1&utm_source=mail")
+        assert get_request_cache_path(request, view()) == "/users/?owner=1"